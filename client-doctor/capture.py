@@ -0,0 +1,143 @@
+import mmap
+import os
+import struct
+import threading
+import time
+import weakref
+
+# File header: magic + format version. Each record is the arrival time
+# (time.time_ns()), the datagram length, a channel number and the index of the
+# network path it arrived on, followed by the datagram bytes exactly as
+# received. Version 1 had a 16-bit channel in place of channel and path; its
+# records read the same, with every datagram on path 0.
+MAGIC = b'SRCAP'
+FILE_HEADER = struct.Struct('<5sBxx')
+RECORD = struct.Struct('<qHBB')
+VERSION = 2
+READABLE_VERSIONS = (1, 2)
+
+CHANNEL_VIDEO = 0
+CHANNEL_COMMAND = 1
+
+
+class CaptureWriter:
+    def __init__(self, path, chunk_size=64 * 1024 * 1024):
+        """
+        Append datagrams with high-resolution arrival times to a memory-mapped file.
+
+        The file is grown in chunks and mapped into memory, so writing a record
+        is a couple of memory copies with no system call. Unused space is
+        zero-filled, so a capture cut short by a crash still reads cleanly up to
+        the last complete record; close() trims the file to its contents.
+
+        Args:
+            path (str): Capture file to create (overwritten if it exists).
+            chunk_size (int): Growth step of the file in bytes.
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self._size = 0
+        self._map = None
+        self._grow(FILE_HEADER.size)
+        FILE_HEADER.pack_into(self._map, 0, MAGIC, VERSION)
+        self._offset = FILE_HEADER.size
+        self.records = 0
+
+    def _grow(self, needed):
+        if self._map is not None:
+            self._map.close()
+        self._size += max(self.chunk_size, needed)
+        os.ftruncate(self._fd, self._size)
+        self._map = mmap.mmap(self._fd, self._size)
+
+    def write(self, data, length=None, channel=CHANNEL_VIDEO, arrival_ns=None, path=0):
+        """
+        Record one datagram.
+
+        Args:
+            data: Bytes-like object holding the datagram.
+            length (int): Number of bytes of data to record (default: all of it).
+            channel (int): Channel the datagram arrived on (e.g. CHANNEL_VIDEO).
+            arrival_ns (int): Arrival time in ns since the epoch (default: now).
+            path (int): Index of the network path the datagram arrived on.
+        """
+        if arrival_ns is None:
+            arrival_ns = time.time_ns()
+        if length is None:
+            length = len(data)
+        with self._lock:
+            if self._map is None:
+                return
+            end = self._offset + RECORD.size + length
+            if end > self._size:
+                self._grow(end - self._size)
+            RECORD.pack_into(self._map, self._offset, arrival_ns, length, channel, path)
+            start = self._offset + RECORD.size
+            self._map[start:end] = data[:length]
+            self._offset = end
+            self.records += 1
+
+    def close(self):
+        """Flush the capture and trim the file to the recorded data."""
+        with self._lock:
+            if self._map is None:
+                return
+            self._map.flush()
+            self._map.close()
+            self._map = None
+            os.ftruncate(self._fd, self._offset)
+            os.close(self._fd)
+
+
+class CaptureReader:
+    def __init__(self, path):
+        """
+        Read a capture file through a read-only memory map.
+
+        Args:
+            path (str): Capture file written by CaptureWriter.
+        """
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = FILE_HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version not in READABLE_VERSIONS:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {'/'.join(map(str, READABLE_VERSIONS))} capture file.")
+        # Open iterations hold views into the map, which must be released before it closes.
+        self._iterations = weakref.WeakSet()
+
+    def __iter__(self):
+        """
+        Yield (arrival_ns, channel, path, datagram) tuples in capture order.
+        The datagram is a memoryview into the mapped file, valid until the
+        next record is requested or the reader is closed; copy it to keep it.
+        """
+        iteration = self._records()
+        self._iterations.add(iteration)
+        return iteration
+
+    def _records(self):
+        size = len(self._map)
+        offset = FILE_HEADER.size
+        with memoryview(self._map) as view:
+            while offset + RECORD.size <= size:
+                arrival_ns, length, channel, path = RECORD.unpack_from(self._map, offset)
+                if arrival_ns == 0:
+                    break  # Zero-filled tail of a capture that was not closed.
+                start = offset + RECORD.size
+                if start + length > size:
+                    break
+                record = view[start:start + length]
+                try:
+                    yield arrival_ns, channel, path, record
+                finally:
+                    record.release()
+                offset = start + length
+
+    def close(self):
+        """Close the file, ending any iteration that was stopped early."""
+        for iteration in list(self._iterations):
+            iteration.close()  # Releases its views into the map.
+        self._map.close()
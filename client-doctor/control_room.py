@@ -0,0 +1,92 @@
+import logging
+from flask import Flask, jsonify, redirect, request, abort
+from sessions import SessionExists, SessionManager
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
+
+
+class ControlRoomServer:
+    def __init__(self, manager, host='0.0.0.0', port=8000):
+        """
+        HTTP front door for a multi-session workstation.
+
+        Routes:
+            GET    /status               Per-session fps, latency, CPU and ports (JSON).
+            GET    /session/<id>         Redirects a VR client to that session's server.
+            POST   /sessions             Starts a session: {"name": ..., "robot_ip": ..., "views": 2};
+                                         409 if a session of that name is running.
+            DELETE /session/<id>         Stops a session and finalizes its recording.
+
+        Args:
+            manager (SessionManager): The sessions to expose.
+            host (str): Host to bind the Flask server to.
+            port (int): Port to listen on.
+        """
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.app = Flask(__name__)
+
+        @self.app.route('/status')
+        def status():
+            return jsonify(self.manager.status())
+
+        @self.app.route('/session/<int:session_id>')
+        def session(session_id):
+            config = self.manager.get(session_id)
+            if config is None:
+                abort(404)
+            return redirect(f"https://{request.host.split(':')[0]}:{config.vr_port}/")
+
+        @self.app.route('/sessions', methods=['POST'])
+        def create_session():
+            body = request.get_json(force=True)
+            if not isinstance(body, dict):
+                return jsonify({"error": "expected a JSON object"}), 400
+            try:
+                config = self.manager.create_session(body["name"], body.get("robot_ip"),
+                                                     int(body.get("views", 1)))
+            except SessionExists as e:
+                return jsonify({"error": str(e)}), 409
+            except (KeyError, ValueError, TypeError, RuntimeError) as e:
+                return jsonify({"error": str(e)}), 400
+            return jsonify({"session_id": config.session_id, "vr_port": config.vr_port,
+                            "video_port": config.video_port, "robot_ip": config.robot_ip,
+                            "views": config.views, "wireguard_peer": config.wireguard_peer()}), 201
+
+        @self.app.route('/session/<int:session_id>', methods=['DELETE'])
+        def delete_session(session_id):
+            if self.manager.get(session_id) is None:
+                abort(404)
+            self.manager.stop_session(session_id)
+            return '', 204
+
+    def run(self):
+        """Start the HTTP server (blocking)."""
+        logger.info("Control room server running on %s:%s", self.host, self.port)
+        self.app.run(host=self.host, port=self.port, ssl_context=('localhost+2.pem', 'localhost+2-key.pem'),
+                     threaded=True)
+
+
+def main():
+    # Sessions started at launch; more can be added via POST /sessions.
+    SESSIONS = [
+        ("theatre-1", "10.8.0.3"),
+    ]
+
+    manager = SessionManager()
+    for name, robot_ip in SESSIONS:
+        manager.create_session(name, robot_ip)
+
+    try:
+        ControlRoomServer(manager).run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("Stopping all sessions...")
+        manager.stop_all()
+
+
+if __name__ == "__main__":
+    main()
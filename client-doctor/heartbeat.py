@@ -0,0 +1,171 @@
+import socket
+import struct
+import threading
+import time
+import collections
+import metrics
+
+# Heartbeat datagrams (same layout in the robot's heartbeat.py):
+#   ping: magic, type, seq, doctor send time (echoed back untouched)
+#   pong: magic, type, seq, echoed send time, ping loss and jitter seen by the
+#         robot, watchdog state, watchdog trips and the last watchdog reaction time.
+MAGIC = b'HB'
+PING = struct.Struct('<2sBId')
+PONG = struct.Struct('<2sBIdffBIf')
+TYPE_PING = 1
+TYPE_PONG = 2
+
+WATCHDOG_STATES = {0: "disarmed", 1: "ok", 2: "tripped"}
+
+
+class HeartbeatMonitor:
+    def __init__(self, robot_ip="10.8.0.3", port=12346, rate=50, timeout=1.0, window=5.0):
+        """
+        Ping the robot at a fixed rate and measure the link from the answers.
+
+        Each ping carries a sequence number and its send time, which the robot
+        echoes back, so the round-trip time needs no clock synchronisation.
+        Jitter is the smoothed variation between consecutive round trips
+        (RFC 3550 style); loss is the fraction of pings in the last `window`
+        seconds not answered within `timeout`. The robot's answers also report
+        the loss and jitter of the pings as seen there, and its watchdog state.
+        The pings themselves keep the robot's motion watchdog fed.
+
+        Args:
+            robot_ip (str): WireGuard address of the robot.
+            port (int): The robot's heartbeat port.
+            rate (float): Pings per second.
+            timeout (float): Seconds after which an unanswered ping counts as lost.
+            window (float): Seconds of pings the loss figure covers.
+        """
+        self.address = (robot_ip, port)
+        self.interval = 1.0 / rate
+        self.timeout = timeout
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.settimeout(0.5)
+        self._running = False
+        self._lock = threading.Lock()
+        self._outstanding = {}
+        self._results = collections.deque(maxlen=max(1, int(window * rate)))
+        self._seq = 0
+
+        self.sent = 0
+        self.answered = 0
+        self.rtt = None        # Smoothed round-trip time in seconds.
+        self.last_rtt = None
+        self.jitter = 0.0      # Smoothed round-trip variation in seconds.
+        self.last_answer = None
+        self.robot_loss = None
+        self.robot_jitter = None
+        self.watchdog_state = None
+        self.watchdog_trips = 0
+        self.watchdog_reaction = None
+
+        metrics.counter("heartbeat_pings_sent_total", "Heartbeat pings sent.", fn=lambda: self.sent)
+        metrics.counter("heartbeat_pongs_total", "Heartbeat answers received.", fn=lambda: self.answered)
+        metrics.gauge("heartbeat_rtt_seconds", "Smoothed round-trip time to the robot.", fn=lambda: self.rtt)
+        metrics.gauge("heartbeat_jitter_seconds", "Smoothed round-trip variation.", fn=lambda: self.jitter)
+        metrics.gauge("heartbeat_loss_ratio", "Fraction of recent pings not answered.", fn=lambda: self.loss)
+        metrics.gauge("heartbeat_robot_loss_ratio", "Ping loss towards the robot, as seen by the robot.",
+                      fn=lambda: self.robot_loss)
+        metrics.counter("heartbeat_watchdog_trips_total", "Motion halts reported by the robot's watchdog.",
+                        fn=lambda: self.watchdog_trips)
+        self._rtt_histogram = metrics.histogram("heartbeat_rtt_histogram_seconds", "Round-trip times.")
+
+    def start(self):
+        """Start the ping and answer threads."""
+        self._running = True
+        threading.Thread(target=self._send_pings, daemon=True).start()
+        threading.Thread(target=self._receive_pongs, daemon=True).start()
+        print(f"Heartbeat to {self.address[0]}:{self.address[1]} at {1 / self.interval:.0f} Hz.")
+
+    def stop(self):
+        """Stop pinging; the robot's watchdog will halt motion once the silence window passes."""
+        self._running = False
+
+    def _send_pings(self):
+        next_due = time.monotonic()
+        while self._running:
+            now = time.monotonic()
+            with self._lock:
+                # Pings unanswered for too long count as lost.
+                while self._outstanding:
+                    seq, sent = next(iter(self._outstanding.items()))
+                    if now - sent < self.timeout:
+                        break
+                    del self._outstanding[seq]
+                    self._results.append(False)
+                self._seq = (self._seq + 1) & 0xFFFFFFFF
+                self._outstanding[self._seq] = now
+            try:
+                self.socket.sendto(PING.pack(MAGIC, TYPE_PING, self._seq, now), self.address)
+                self.sent += 1
+            except OSError as e:
+                print(f"Heartbeat send error: {e}")
+            next_due += self.interval
+            delay = next_due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_due = time.monotonic()  # Fell behind; do not send a burst to catch up.
+
+    def _receive_pongs(self):
+        buf = bytearray(64)
+        while self._running:
+            try:
+                nbytes = self.socket.recv_into(buf)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                print(f"Heartbeat receive error: {e}")
+                time.sleep(0.5)
+                continue
+            now = time.monotonic()
+            if nbytes != PONG.size:
+                continue
+            magic, kind, seq, sent, robot_loss, robot_jitter, state, trips, reaction = PONG.unpack_from(buf)
+            if magic != MAGIC or kind != TYPE_PONG:
+                continue
+            with self._lock:
+                if self._outstanding.pop(seq, None) is None:
+                    continue  # Late (already counted as lost) or duplicate.
+                self._results.append(True)
+            rtt = now - sent
+            if self.last_rtt is not None:
+                self.jitter += (abs(rtt - self.last_rtt) - self.jitter) / 16
+            self.last_rtt = rtt
+            self.rtt = rtt if self.rtt is None else 0.9 * self.rtt + 0.1 * rtt
+            self._rtt_histogram.observe(rtt)
+            self.answered += 1
+            self.last_answer = now
+            self.robot_loss = robot_loss
+            self.robot_jitter = robot_jitter
+            self.watchdog_state = state
+            self.watchdog_trips = trips
+            self.watchdog_reaction = reaction if trips else None
+
+    @property
+    def loss(self):
+        """Fraction of recent pings that were not answered in time."""
+        with self._lock:
+            results = list(self._results)
+        if not results:
+            return None
+        return results.count(False) / len(results)
+
+    def link_quality(self):
+        """Current link figures, as sent to the VR clients."""
+        silence = time.monotonic() - self.last_answer if self.last_answer else None
+        return {
+            "rtt_ms": self.rtt * 1000 if self.rtt is not None else None,
+            "jitter_ms": self.jitter * 1000,
+            "loss": self.loss,
+            "robot_loss": self.robot_loss,
+            "robot_jitter_ms": self.robot_jitter * 1000 if self.robot_jitter is not None else None,
+            "silence_ms": silence * 1000 if silence is not None else None,
+            "connected": silence is not None and silence < self.timeout,
+            "watchdog": WATCHDOG_STATES.get(self.watchdog_state, "unknown"),
+            "watchdog_trips": self.watchdog_trips,
+            "watchdog_reaction_ms": (self.watchdog_reaction * 1000
+                                     if self.watchdog_reaction is not None else None),
+        }
@@ -0,0 +1,121 @@
+import argparse
+import heapq
+import random
+import socket
+import threading
+import time
+
+
+class LinkEmulator:
+    def __init__(self, listen, forward, delay=0.0, jitter=0.0, loss=0.0):
+        """
+        Forward UDP datagrams with added delay, jitter and random loss.
+
+        Used to try multipath streaming on one machine without root (tc netem):
+        run one emulator per path, each on its own loopback address, with
+        independent impairments.
+
+        Args:
+            listen (tuple): (host, port) to receive on.
+            forward (tuple): (host, port) to forward to.
+            delay (float): Added one-way delay in seconds.
+            jitter (float): Maximum random extra delay in seconds.
+            loss (float): Probability of dropping a datagram (0..1).
+        """
+        self.forward = forward
+        self.delay = delay
+        self.jitter = jitter
+        self.loss = loss
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(listen)
+        self.socket.settimeout(0.5)
+        self._pending = []
+        self._order = 0
+        self._condition = threading.Condition()
+        self._running = True
+        self.forwarded = 0
+        self.dropped = 0
+
+    def start(self):
+        threading.Thread(target=self._receive, daemon=True).start()
+        threading.Thread(target=self._send, daemon=True).start()
+
+    def _receive(self):
+        while self._running:
+            try:
+                data = self.socket.recv(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if random.random() < self.loss:
+                self.dropped += 1
+                continue
+            due = time.monotonic() + self.delay + random.uniform(0, self.jitter)
+            with self._condition:
+                # The counter keeps datagrams with equal due times in arrival order.
+                heapq.heappush(self._pending, (due, self._order, data))
+                self._order += 1
+                self._condition.notify()
+
+    def _send(self):
+        out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        while self._running:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait(0.5)
+                if not self._pending:
+                    continue
+                due, _, data = self._pending[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                heapq.heappop(self._pending)
+            out.sendto(data, self.forward)
+            self.forwarded += 1
+
+    def stop(self):
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+        self.socket.close()
+
+
+def _address(text):
+    host, port = text.rsplit(":", 1)
+    return host, int(port)
+
+
+def main():
+    """
+    Emulate an impaired network path, e.g. two paths with different quality:
+
+        python link_emulator.py --listen 127.0.0.1:11189 --forward 127.0.0.1:1189 --delay 20 --loss 2
+        python link_emulator.py --listen 127.0.0.1:11190 --forward 127.0.0.2:1189 --delay 45 --jitter 15
+
+    with the robot sending to both listen ports and the doctor receiving on
+    both forward addresses (VIDEO_PATHS / video_paths).
+    """
+    parser = argparse.ArgumentParser(description="Forward UDP with delay, jitter and loss.")
+    parser.add_argument("--listen", type=_address, required=True, help="host:port to receive on")
+    parser.add_argument("--forward", type=_address, required=True, help="host:port to forward to")
+    parser.add_argument("--delay", type=float, default=0.0, help="one-way delay in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra delay up to ms")
+    parser.add_argument("--loss", type=float, default=0.0, help="loss in percent")
+    args = parser.parse_args()
+
+    link = LinkEmulator(args.listen, args.forward, args.delay / 1000, args.jitter / 1000, args.loss / 100)
+    link.start()
+    print(f"Forwarding {args.listen[0]}:{args.listen[1]} -> {args.forward[0]}:{args.forward[1]} "
+          f"(delay {args.delay} ms, jitter {args.jitter} ms, loss {args.loss}%)")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"forwarded {link.forwarded}, dropped {link.dropped}")
+    except KeyboardInterrupt:
+        link.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,9 @@ import datetime
 import threading
 import sys
 from network import VideoStreamReceiver
-from recorder import VideoRecorder
-from s3_uploader import upload_file_to_s3
+from recorder import VideoRecorder, finalize_recording
 from vr import VRStreamingServer
+from heartbeat import HeartbeatMonitor
 
 def main():
     os.environ['TZ'] = 'Europe/Sofia'
@@ -15,12 +15,20 @@ def main():
 
     tz = pytz.timezone('Europe/Sofia')
     start_dt = datetime.datetime.now(tz)
-    start_year = start_dt.strftime('%Y')
-    start_month = start_dt.strftime('%m')
-    start_day = start_dt.strftime('%d')
-    start_time_str = start_dt.strftime('%H-%M-%S')
 
-    video_receiver = VideoStreamReceiver(host='0.0.0.0', port=1189)
+    # Set to ('10.8.0.1', 1190) to pull the stream from the hub's relay instead
+    # of having the robot send it here directly.
+    video_relay = None
+    # Set to e.g. "session.cap" to capture the received datagrams for replay.py.
+    capture_path = None
+    # Local addresses to receive a multipath stream on, one per tunnel/interface,
+    # e.g. [('10.8.0.2', 1189), ('10.9.0.2', 1189)].
+    video_paths = None
+    # 2 when the robot sends its stereo camera pair side by side (CAMERA_VIEWS).
+    camera_views = 1
+    video_receiver = VideoStreamReceiver(host='0.0.0.0', port=1189, relay=video_relay,
+                                         capture_path=capture_path, paths=video_paths,
+                                         views=camera_views)
     
     temp_filename = "recording_temp.mp4"
     recorder = VideoRecorder(temp_filename, video_receiver.width, video_receiver.height, video_receiver.framerate)
@@ -29,7 +37,11 @@ def main():
 
     video_receiver.start()
 
-    vr_server = VRStreamingServer(video_receiver, host='0.0.0.0', port=5000)
+    # 50 Hz heartbeat to the robot: measures the link and keeps its motion watchdog fed.
+    heartbeat = HeartbeatMonitor(robot_ip='10.8.0.3', port=12346, rate=50)
+    heartbeat.start()
+
+    vr_server = VRStreamingServer(video_receiver, host='0.0.0.0', port=5000, heartbeat=heartbeat)
     server_thread = threading.Thread(target=vr_server.run, daemon=True)
     server_thread.start()
     print("VR Socket.IO Server started on port 5000.")
@@ -55,21 +67,13 @@ def main():
         server_thread.join()
 
     # Clean up
+    heartbeat.stop()
     video_receiver.stop()
     recorder.stop()
 
     # Save and upload the recorded video.
     end_dt = datetime.datetime.now(tz)
-    end_time_str = end_dt.strftime('%H-%M-%S')
-    final_filename = f"{start_year}-{start_month}-{start_day}__{start_time_str}__{end_time_str}.mp4"
-    os.rename(temp_filename, final_filename)
-    print("Recording saved as:", final_filename)
-
-    upload_file_to_s3(final_filename, "surgery-robot-recordings", final_filename)
-    print("Video uploaded to S3.")
-
-    os.remove(final_filename)
-    print("Local file removed.")
+    finalize_recording(temp_filename, start_dt, end_dt)
 
 if __name__ == "__main__":
     main()
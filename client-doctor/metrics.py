@@ -0,0 +1,190 @@
+import bisect
+import os
+import sys
+import threading
+import time
+import collections
+
+# Latency buckets in seconds, from sub-millisecond to several seconds.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in sorted(labels.items())) + '}'
+
+
+class Counter:
+    __slots__ = ('labels', 'value', 'fn')
+
+    def __init__(self, labels, fn=None):
+        """
+        A monotonically increasing value. With fn, the value is read at scrape time
+        from a counter the component already keeps.
+        """
+        self.labels = labels
+        self.value = 0
+        self.fn = fn
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def render(self, name):
+        value = self.value
+        if self.fn is not None:
+            try:
+                value = self.fn()
+            except Exception:
+                return
+            if value is None:
+                return
+        yield f"{name}{self.labels} {value}"
+
+
+class Gauge:
+    __slots__ = ('labels', 'value', 'fn')
+
+    def __init__(self, labels, fn=None):
+        """
+        A value that can go up and down. With fn, the value is computed at scrape
+        time, so the hot path pays nothing for it.
+        """
+        self.labels = labels
+        self.value = 0
+        self.fn = fn
+
+    def set(self, value):
+        self.value = value
+
+    def render(self, name):
+        value = self.value
+        if self.fn is not None:
+            try:
+                value = self.fn()
+            except Exception:
+                return
+            if value is None:
+                return
+        yield f"{name}{self.labels} {value}"
+
+
+class Histogram:
+    __slots__ = ('labels', 'buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, labels, buckets):
+        """Distribution of observed values in fixed buckets (one bisect per observation)."""
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name):
+        base = self.labels[1:-1] + ',' if self.labels else ''
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{base}le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{base}le="+Inf"}} {self.count}'
+        yield f"{name}_sum{self.labels} {self.sum}"
+        yield f"{name}_count{self.labels} {self.count}"
+
+
+class Registry:
+    def __init__(self):
+        """
+        Process-wide collection of metrics, rendered in the Prometheus text format.
+
+        Metrics are created once (get-or-create by name and labels) and then
+        updated without locks: counters and histograms may lose an increment
+        under heavy contention, which is acceptable for monitoring.
+        """
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, help_text, labels, factory):
+        key = _format_labels(labels)
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = (kind, help_text, {})
+                self._families[name] = family
+            elif family[0] != kind:
+                raise ValueError(f"Metric {name} already registered as a {family[0]}.")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = factory(key)
+                family[2][key] = metric
+            return metric
+
+    def counter(self, name, help_text, labels=None, fn=None):
+        counter = self._get('counter', name, help_text, labels, lambda key: Counter(key, fn))
+        if fn is not None:
+            counter.fn = fn  # A re-created component takes over the callback.
+        return counter
+
+    def gauge(self, name, help_text, labels=None, fn=None):
+        gauge = self._get('gauge', name, help_text, labels, lambda key: Gauge(key, fn))
+        if fn is not None:
+            gauge.fn = fn  # A re-created component takes over the callback.
+        return gauge
+
+    def histogram(self, name, help_text, labels=None, buckets=DEFAULT_BUCKETS):
+        return self._get('histogram', name, help_text, labels, lambda key: Histogram(key, buckets))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            families = list(self._families.items())
+        for name, (kind, help_text, metrics) in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in list(metrics.values()):
+                lines.extend(metric.render(name))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+_profile_lock = threading.Lock()
+
+
+def sample_profile(duration=10.0, interval=0.005):
+    """
+    Sample the stacks of all threads for `duration` seconds.
+
+    Returns the profile in the collapsed-stack format ("thread;outer;...;inner count"
+    per line), which flamegraph.pl and speedscope render as a flame graph.
+    Only one profile runs at a time.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already being recorded.")
+    try:
+        samples = collections.Counter()
+        me = threading.get_ident()
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                samples[';'.join(reversed(stack))] += 1
+            time.sleep(interval)
+        return '\n'.join(f"{stack} {count}" for stack, count in samples.most_common()) + '\n'
+    finally:
+        _profile_lock.release()
@@ -0,0 +1,130 @@
+TS_PACKET_SIZE = 188
+SYNC_BYTE = 0x47
+PAT_PID = 0x0000
+NULL_PID = 0x1FFF
+PTS_MODULO = 1 << 33
+PTS_CLOCK = 90000
+
+
+def pts_delta(previous, current):
+    """Signed difference between two 33-bit PTS values, in 90 kHz ticks."""
+    delta = (current - previous) % PTS_MODULO
+    if delta >= PTS_MODULO // 2:
+        delta -= PTS_MODULO
+    return delta
+
+
+class TsInspector:
+    def __init__(self):
+        """
+        Lightweight MPEG-TS parser used to watch a live stream for discontinuities.
+
+        Tracks per-PID continuity counters, the PTS of video PES packets, and keeps
+        the most recent PAT/PMT packets so that a fresh decoder can be primed
+        with them when it joins the stream mid-way.
+        """
+        self.reset()
+
+    def reset(self):
+        """Forget all stream state (e.g. when a new stream session starts)."""
+        self._continuity = {}
+        self.pmt_pid = None
+        self.pat_packet = None
+        self.pmt_packet = None
+        self.last_pts = None
+
+    def psi_packets(self):
+        """Return the cached PAT and PMT packets as bytes (empty if not yet seen)."""
+        if self.pat_packet is None or self.pmt_packet is None:
+            return b''
+        return self.pat_packet + self.pmt_packet
+
+    def inspect(self, payload):
+        """
+        Inspect a buffer of whole TS packets.
+
+        Args:
+            payload (memoryview): One or more 188-byte TS packets.
+
+        Returns:
+            tuple: (continuity_errors, pts) where pts is the last video PTS found
+                   in the buffer, or None.
+        """
+        errors = 0
+        pts = None
+        for offset in range(0, len(payload) - TS_PACKET_SIZE + 1, TS_PACKET_SIZE):
+            packet = payload[offset:offset + TS_PACKET_SIZE]
+            if packet[0] != SYNC_BYTE:
+                errors += 1
+                continue
+            pid = ((packet[1] & 0x1F) << 8) | packet[2]
+            if pid == NULL_PID:
+                continue
+            unit_start = packet[1] & 0x40
+            adaptation = (packet[3] >> 4) & 0x3
+            counter = packet[3] & 0x0F
+
+            start = 4
+            discontinuity = False
+            if adaptation & 0x2:
+                length = packet[4]
+                if length:
+                    discontinuity = bool(packet[5] & 0x80)
+                start = 5 + length
+
+            if adaptation & 0x1:
+                previous = self._continuity.get(pid)
+                if (previous is not None and not discontinuity
+                        and counter != previous and counter != (previous + 1) & 0x0F):
+                    errors += 1
+                self._continuity[pid] = counter
+            else:
+                continue
+
+            if pid == PAT_PID:
+                self.pat_packet = bytes(packet)
+                if unit_start and start < TS_PACKET_SIZE:
+                    self._parse_pat(packet, start)
+            elif pid == self.pmt_pid:
+                self.pmt_packet = bytes(packet)
+            elif unit_start:
+                found = self._parse_pes_pts(packet, start)
+                if found is not None:
+                    pts = found
+        if pts is not None:
+            self.last_pts = pts
+        return errors, pts
+
+    def _parse_pat(self, packet, start):
+        """Extract the first program's PMT PID from a PAT section."""
+        section = start + 1 + packet[start]  # Skip the pointer field.
+        if section + 3 > TS_PACKET_SIZE:
+            return
+        length = ((packet[section + 1] & 0x0F) << 8) | packet[section + 2]
+        # Entries follow table_id(1) + length(2) + tsid(2) + version(1) + section numbers(2)
+        # and stop before the 4-byte CRC.
+        entry = section + 8
+        end = min(section + 3 + length - 4, TS_PACKET_SIZE)
+        while entry + 4 <= end:
+            program = (packet[entry] << 8) | packet[entry + 1]
+            pid = ((packet[entry + 2] & 0x1F) << 8) | packet[entry + 3]
+            if program != 0:
+                self.pmt_pid = pid
+                return
+            entry += 4
+
+    @staticmethod
+    def _parse_pes_pts(packet, start):
+        """Return the PTS of a video PES header starting at start, or None."""
+        if start + 14 > TS_PACKET_SIZE:
+            return None
+        if packet[start] != 0 or packet[start + 1] != 0 or packet[start + 2] != 1:
+            return None
+        stream_id = packet[start + 3]
+        if stream_id & 0xF0 != 0xE0:
+            return None
+        if not packet[start + 7] & 0x80:
+            return None
+        p = start + 9
+        return (((packet[p] >> 1) & 0x07) << 30 | packet[p + 1] << 22 |
+                (packet[p + 2] >> 1) << 15 | packet[p + 3] << 7 | packet[p + 4] >> 1)
@@ -1,33 +1,41 @@
+import os
+import json
 import socket
-import struct
 import threading
 import queue
 import time
 import cv2
 import numpy as np
 import subprocess
+from udp_transport import (DatagramReceiver, ReorderBuffer, BufferPool, ParityRecovery, PathStats,
+                           FLAG_KEYFRAME, FLAG_PARITY)
+from mpegts import TsInspector, pts_delta, PTS_CLOCK
+from capture import CaptureWriter
+import metrics
+import logging
 
-class VideoStreamReceiver:
-    def __init__(self, host='0.0.0.0', port=1189, width=640, height=480, framerate=30):
+logger = logging.getLogger(__name__)
+
+class FFmpegDecoder:
+    def __init__(self, width, height, on_frame):
         """
-        Initialize the VideoStreamReceiver to decode MPEG-TS compressed frames.
+        A persistent FFmpeg process decoding an MPEG-TS stream into raw BGR frames.
+
+        Args:
+            width (int): Output frame width.
+            height (int): Output frame height.
+            on_frame (callable): Called as on_frame(decoder, frame) for each decoded frame.
         """
-        self.host = host
-        self.port = port
         self.width = width
         self.height = height
-        self.framerate = framerate
-
-        # Queue for holding received MPEG-TS chunks.
-        self.mpeg_queue = queue.Queue()
-        # Queue for decoded frames (raw BGR frames).
-        self.decoded_frame_queue = queue.Queue(maxsize=2)
-        self._running = True
-
-        # Start persistent FFmpeg process to decode MPEG-TS stream into raw frames.
+        self.on_frame = on_frame
+        self.spawned_at = time.monotonic()
+        self.activated_at = None  # Set when the decoder starts receiving the stream.
         ffmpeg_cmd = [
             "ffmpeg",
             "-loglevel", "quiet",
+            "-fflags", "nobuffer",        # Emit frames as soon as they are decoded.
+            "-analyzeduration", "0",      # The stream is always primed with PAT/PMT + keyframe.
             "-f", "mpegts",
             "-i", "pipe:0",               # Read MPEG-TS stream from stdin.
             "-f", "rawvideo",
@@ -35,118 +43,535 @@ class VideoStreamReceiver:
             "-s", f"{self.width}x{self.height}",
             "pipe:1"                      # Output raw video frames to stdout.
         ]
-        self.ffmpeg_process = subprocess.Popen(
+        self.process = subprocess.Popen(
             ffmpeg_cmd,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             bufsize=0
         )
+        self._closed = False
+        threading.Thread(target=self._read_frames, daemon=True).start()
+
+    def write(self, views):
+        """Write a list of buffers to FFmpeg's stdin with gathered writes, handling short writes."""
+        fd = self.process.stdin.fileno()
+        remaining = sum(len(view) for view in views)
+        while remaining:
+            written = os.writev(fd, views)
+            remaining -= written
+            if not remaining:
+                break
+            # Drop the fully written buffers and trim the partially written one.
+            while written >= len(views[0]):
+                written -= len(views[0])
+                views = views[1:]
+            views = [views[0][written:]] + views[1:]
+
+    def _read_exactly(self, view):
+        """
+        Utility to fill view with exactly len(view) bytes from FFmpeg's stdout.
+        """
+        filled = 0
+        while filled < len(view):
+            nbytes = self.process.stdout.readinto(view[filled:])
+            if not nbytes:
+                return False
+            filled += nbytes
+        return True
+
+    def _read_frames(self):
+        """
+        Read raw video frames from FFmpeg's stdout straight into new frame arrays.
+        Each frame has a fixed size: width * height * 3 bytes (BGR24).
+        """
+        while not self._closed:
+            frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+            try:
+                if not self._read_exactly(memoryview(frame).cast('B')):
+                    break  # FFmpeg exited or was retired.
+                self.on_frame(self, frame)
+            except Exception as e:
+                if not self._closed:
+                    print(f"FFmpeg stdout read error: {e}")
+                break
+
+    def close(self):
+        """Terminate the FFmpeg process."""
+        self._closed = True
+        try:
+            self.process.stdin.close()
+            self.process.terminate()
+        except Exception as e:
+            print(f"Error terminating FFmpeg process: {e}")
+
+
+class VideoStreamReceiver:
+    # A PTS step larger than this (in 90 kHz ticks) means the stream restarted.
+    PTS_JUMP_LIMIT = 2 * PTS_CLOCK
+    # Continuity errors not explained by lost datagrams, per second, before resyncing.
+    CONTINUITY_ERROR_LIMIT = 8
+
+    def __init__(self, host='0.0.0.0', port=1189, width=640, height=480, framerate=30,
+                 rcvbuf=4 * 1024 * 1024, relay=None, subscriber_name="doctor", reorder_delay=0.04,
+                 capture_path=None, paths=None, views=1):
+        """
+        Initialize the VideoStreamReceiver to decode MPEG-TS compressed frames.
+
+        A standby FFmpeg decoder is kept spawned at all times. When the stream
+        restarts (new session ID, PTS jump, or a burst of continuity errors),
+        incoming data is discarded until the next keyframe, and then the standby
+        decoder takes over, primed with the stream's PAT/PMT. The stale decoder
+        is retired, and a new standby is spawned in the background.
+
+        When `relay` is given, the stream is pulled from the hub's relay instead
+        of being sent here directly: the receiver keeps its subscription alive
+        and NACKs missing sequence numbers, holding later datagrams for up to
+        reorder_delay seconds so that retransmissions can fill the gaps.
+
+        With `capture_path`, every datagram is written to a capture file with
+        its arrival time, so the session can be replayed later with replay.py.
+
+        With `paths`, the stream is received on several local addresses at once
+        (one per network path the robot sends over, see MultipathSender). The
+        copies are merged by sequence number: the first copy of each datagram
+        is decoded and later ones are dropped as duplicates. Single datagrams
+        lost on every path are rebuilt from parity when the robot sends it.
+        Per-path loss, delay and "won the race" counts are kept in path_stats.
+
+        Args:
+            rcvbuf (int): Requested SO_RCVBUF size, large enough to absorb keyframe bursts.
+            relay (tuple): (host, port) of the relay's subscribe address, or None.
+            subscriber_name (str): Name reported to the relay.
+            reorder_delay (float): Seconds to wait for a retransmission or a slower path
+                (relay and multipath only).
+            capture_path (str): File to capture received datagrams to, or None.
+            paths (list): Local (host, port) addresses, one per network path;
+                replaces host/port when given.
+            views (int): Camera views packed side by side in each frame (2 for the
+                robot's stereo pair); frames are decoded at views * width.
+        """
+        self.host = host
+        self.port = port
+        self.views = views
+        self.width = width * views
+        self.height = height
+        self.framerate = framerate
+        self.rcvbuf = rcvbuf
+        self.transport = None
+        self.socket_drops = 0
+        self.relay = relay
+        self.subscriber_name = subscriber_name
+        self.paths = list(paths) if paths else [(host, port)]
+        self.multipath = len(self.paths) > 1
+        # Relayed and multipath streams arrive out of order, so gaps are waited on.
+        self.reorder = ReorderBuffer(delay=reorder_delay if relay or self.multipath else 0.0)
+        self.nacks_sent = 0
+        self.transports = []
+        self.path_stats = []
+        self.parity = None
+        self.capture_path = capture_path
+        self.capture = None
+
+        # Queue for holding batches of received MPEG-TS chunks.
+        self.mpeg_queue = queue.Queue()
+        # Queue for decoded frames (raw BGR frames).
+        self.decoded_frame_queue = queue.Queue(maxsize=2)
+        self._running = True
+
+        # Stream state used to detect discontinuities.
+        self.inspector = TsInspector()
+        self.session_id = None
+        self._last_seq = None
+        self._continuity_errors = 0
+        self._continuity_window = time.monotonic()
+
+        # Active decoder plus a pre-spawned warm standby. The first keyframe
+        # activates the standby just like a resync does.
+        self.decoder = None
+        self.standby = None
+        self._standby_lock = threading.Lock()
+        self._spawn_standby()
+        self._resync_pending = True
+        self._resync_started = None
+        self._awaiting_first_frame = False
+        self.resync_count = 0
+        self.last_time_to_first_frame = None
+        self.last_decoder_first_frame = None  # Activation to first frame of the (standby) decoder.
+        self.last_standby_age = None          # How long the activated decoder had been warm.
         self.recorder = None
 
+        # Counters for status reporting.
+        self.frames_decoded = 0
+        self.latency = None  # Smoothed sender-to-receiver delay in seconds.
+        self._init_metrics()
+
+    def _init_metrics(self):
+        """Register metrics; most read counters this receiver already keeps at scrape time."""
+        def transport(attribute):
+            return lambda: getattr(self.transport, attribute) if self.transport else None
+
+        metrics.counter("video_receiver_packets_total", "Valid video datagrams received.",
+                        fn=transport("packets_received"))
+        metrics.counter("video_receiver_bytes_total", "Video bytes received.",
+                        fn=transport("bytes_received"))
+        metrics.counter("video_receiver_malformed_total", "Datagrams with an invalid header.",
+                        fn=transport("malformed"))
+        metrics.counter("video_receiver_pool_exhausted_total",
+                        "Receive waits that found no free datagram buffer.",
+                        fn=lambda: sum(transport.pool_exhausted for transport in self.transports)
+                        if self.transports else None)
+        metrics.gauge("video_receiver_socket_drops", "Kernel drop counter of the video socket.",
+                      fn=lambda: self.socket_drops)
+        metrics.counter("video_receiver_duplicates_total", "Duplicate or late datagrams discarded.",
+                        fn=lambda: self.reorder.duplicates)
+        metrics.counter("video_receiver_skipped_total", "Datagrams given up on as lost.",
+                        fn=lambda: self.reorder.skipped)
+        metrics.counter("video_receiver_nacks_total", "NACK requests sent to the relay.",
+                        fn=lambda: self.nacks_sent)
+        metrics.counter("video_receiver_resyncs_total", "Decoder switches after stream discontinuities.",
+                        fn=lambda: self.resync_count)
+        metrics.gauge("video_receiver_time_to_first_frame_seconds",
+                      "Time from the last stream (re)start to its first decoded frame.",
+                      fn=lambda: self.last_time_to_first_frame)
+        metrics.gauge("video_receiver_decoder_first_frame_seconds",
+                      "Time from activating the standby decoder to its first decoded frame.",
+                      fn=lambda: self.last_decoder_first_frame)
+        metrics.gauge("video_receiver_standby_age_seconds",
+                      "Time the activated decoder had been spawned before taking over.",
+                      fn=lambda: self.last_standby_age)
+        metrics.counter("video_receiver_captured_total", "Datagrams written to the capture file.",
+                        fn=lambda: self.capture.records if self.capture else None)
+        metrics.counter("video_receiver_frames_decoded_total", "Frames decoded.",
+                        fn=lambda: self.frames_decoded)
+        metrics.gauge("video_receiver_latency_seconds", "Smoothed sender-to-receiver delay.",
+                      fn=lambda: self.latency)
+        metrics.gauge("video_receiver_mpeg_queue_depth", "Batches waiting for the decoder feed thread.",
+                      fn=self.mpeg_queue.qsize)
+        metrics.gauge("video_receiver_frame_queue_depth", "Decoded frames waiting for the VR server.",
+                      fn=self.decoded_frame_queue.qsize)
+        for index in range(len(self.paths) if self.multipath else 0):
+            def path(attribute, index=index):
+                return lambda: getattr(self.path_stats[index], attribute) if self.path_stats else None
+
+            labels = {"path": str(index)}
+            metrics.counter("video_receiver_path_packets_total", "Datagrams received per path.",
+                            labels, fn=path("received"))
+            metrics.gauge("video_receiver_path_loss_ratio", "Estimated loss per path.",
+                          labels, fn=path("loss"))
+            metrics.gauge("video_receiver_path_latency_seconds", "Smoothed sender-to-receiver delay per path.",
+                          labels, fn=path("latency"))
+            metrics.counter("video_receiver_path_won_total", "Datagrams whose first copy arrived on this path.",
+                            labels, fn=path("won"))
+            metrics.counter("video_receiver_path_lost_race_total", "Copies that arrived after another path's.",
+                            labels, fn=path("lost_race"))
+            metrics.counter("video_receiver_path_recovered_total", "Datagrams rebuilt from this path's parity.",
+                            labels, fn=path("recovered"))
+        if self.multipath:
+            metrics.counter("video_receiver_parity_unrecoverable_total",
+                            "Overdue datagrams parity could not rebuild (group incomplete or no free buffer).",
+                            fn=lambda: self.parity.unrecoverable if self.parity else None)
+        self._latency_histogram = metrics.histogram(
+            "video_receiver_delay_seconds", "Sender-to-receiver delay per datagram batch.")
+        self._decoder_write = metrics.histogram(
+            "video_receiver_decoder_write_seconds", "Time to write one batch to FFmpeg's stdin.")
+
     def start(self):
         """
         Start threads:
-          - UDP receiver thread to get MPEG-TS chunks.
-          - FFmpeg feed thread to write chunks to FFmpeg's stdin.
-          - FFmpeg reader thread to decode raw frames from FFmpeg's stdout.
+          - UDP receiver thread to get MPEG-TS chunks (one per path).
+          - FFmpeg feed thread to write chunks to the active decoder's stdin.
+          - Relay subscription thread (if a relay is configured).
+        Each decoder runs its own reader thread for raw frames.
         """
-        threading.Thread(target=self.receive_video, daemon=True).start()
+        if self.capture_path:
+            self.capture = CaptureWriter(self.capture_path)
+            print(f"Capturing video datagrams to {self.capture_path}")
+        # Paths share one buffer pool, so the feed thread can release any datagram.
+        pool = BufferPool(512 * len(self.paths), 8192) if self.multipath else None
+        for index, (host, port) in enumerate(self.paths):
+            transport = DatagramReceiver(host, port, rcvbuf=self.rcvbuf, capture=self.capture,
+                                         pool=pool, path=index)
+            self.transports.append(transport)
+            if self.multipath:
+                self.path_stats.append(PathStats(index, transport.socket.getsockname()))
+        self.transport = self.transports[0]
+        if self.multipath:
+            self.parity = ParityRecovery(pool)
+            self.reorder.recover = self._recover
+            print(f"Receiving video over {len(self.paths)} paths: "
+                  + ", ".join(f"{host}:{port}" for host, port in self.paths))
+        for transport in self.transports:
+            threading.Thread(target=self.receive_video, args=(transport,), daemon=True).start()
         threading.Thread(target=self._feed_ffmpeg, daemon=True).start()
-        threading.Thread(target=self._read_ffmpeg, daemon=True).start()
+        if self.relay:
+            threading.Thread(target=self._keep_subscribed, daemon=True).start()
 
     def stop(self):
         """Stop the receiver and clean up resources."""
         self._running = False
-        if self.ffmpeg_process:
-            try:
-                self.ffmpeg_process.stdin.close()
-                self.ffmpeg_process.terminate()
-            except Exception as e:
-                print(f"Error terminating FFmpeg process: {e}")
+        for decoder in (self.decoder, self.standby):
+            if decoder:
+                decoder.close()
+        if self.capture:
+            self.capture.close()
+            print(f"Captured {self.capture.records} datagrams to {self.capture_path}")
 
-    def receive_video(self):
+    def receive_video(self, transport=None):
         """
         Listen for UDP packets containing MPEG-TS chunks.
         Each packet has a header:
           - 8 bytes: timestamp (double)
-          - 4 bytes: chunk size (int)
+          - 4 bytes: session ID (uint)
+          - 4 bytes: sequence number (uint)
+          - 2 bytes: flags (keyframe)
+          - 2 bytes: chunk size
         Followed by the MPEG-TS data.
+
+        Packets are received in batches into pooled buffers; the feed thread
+        returns the buffers to the pool once the data has reached FFmpeg.
+
+        Args:
+            transport (DatagramReceiver): The path to receive on (default: the first).
         """
-        buffSize = 65535
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.bind((self.host, self.port))
-        print('Waiting for MPEG-TS video frames...')
+        transport = transport or self.transport
+        stats = self.path_stats[transport.path] if self.multipath else None
+        if transport is self.transport:
+            print('Waiting for MPEG-TS video frames...')
+        last_drop_check = time.monotonic()
         try:
-            print(self._running)
             while self._running:
-                packet, _ = sock.recvfrom(buffSize)
-                # print(f"Received UDP packet: {len(packet)} bytes")
-                if len(packet) < 12:
-                    continue
-                timestamp, size = struct.unpack('di', packet[:12])
-                data = packet[12:]
-                if len(data) != size:
-                    continue
-                self.mpeg_queue.put(data)
+                batch = transport.receive_batch()
+                if batch:
+                    if stats is not None:
+                        arrival = time.time()
+                        group = self.parity.group_size
+                        for datagram in batch:
+                            stats.update(datagram, arrival, group)
+                    self.mpeg_queue.put(batch)
+                now = time.monotonic()
+                if transport is self.transport and now - last_drop_check >= 1.0:
+                    last_drop_check = now
+                    self._check_socket_drops()
         except Exception as e:
             print(f"Video receive error: {e}")
         finally:
-            sock.close()
+            transport.close()
+
+    def _check_socket_drops(self):
+        """Report datagrams dropped by the kernel because the receive buffer overflowed."""
+        counts = [transport.drops() for transport in self.transports]
+        counts = [count for count in counts if count is not None]
+        if not counts:
+            return
+        drops = sum(counts)
+        if drops > self.socket_drops:
+            print(f"Kernel dropped {drops - self.socket_drops} video datagrams "
+                  f"(receive buffer {self.transport.rcvbuf} bytes).")
+        self.socket_drops = drops
+
+    def _keep_subscribed(self):
+        """Refresh the relay subscription until stopped, then unsubscribe."""
+        subscribe = json.dumps({"type": "subscribe", "name": self.subscriber_name,
+                                "recovery": True}).encode()
+        print(f"Subscribing to video relay at {self.relay[0]}:{self.relay[1]}...")
+        while self._running:
+            try:
+                self.transport.socket.sendto(subscribe, self.relay)
+            except OSError as e:
+                print(f"Relay subscribe error: {e}")
+            time.sleep(2.0)
+        try:
+            self.transport.socket.sendto(json.dumps({"type": "unsubscribe"}).encode(), self.relay)
+        except OSError:
+            pass
+
+    def _send_nack(self, seqs):
+        """Ask the relay to retransmit missing datagrams."""
+        try:
+            self.transport.socket.sendto(json.dumps({"type": "nack", "seqs": seqs}).encode(),
+                                         self.relay)
+            self.nacks_sent += 1
+        except OSError as e:
+            print(f"Relay NACK error: {e}")
 
     def _feed_ffmpeg(self):
         """
-        Continuously read MPEG-TS chunks from the queue and write them to FFmpeg's stdin.
+        Continuously read batches of MPEG-TS chunks from the queue, put them back
+        in sequence order, watch them for stream discontinuities, and write them
+        to the active decoder's stdin with a single gathered write per batch.
         """
+        poll_interval = min(0.1, self.reorder.delay / 2) if self.reorder.delay else 0.1
         while self._running:
             try:
-                data = self.mpeg_queue.get(timeout=0.1)
-                # print(f"Received MPEG-TS chunk: {len(data)} bytes")
+                batch = self.mpeg_queue.get(timeout=poll_interval)
             except queue.Empty:
+                batch = []
+            now = time.monotonic()
+            ready, discarded, missing = [], [], []
+            for datagram in batch:
+                if self.parity is not None:
+                    self.parity.push(datagram)
+                    if datagram.flags & FLAG_PARITY:
+                        discarded.append(datagram)
+                        continue
+                in_order, unused, lost = self.reorder.push(datagram, now)
+                if self.multipath:
+                    # The first copy of a datagram is taken; later copies are duplicates.
+                    if unused:
+                        self.path_stats[datagram.path].lost_race += 1
+                    else:
+                        self.path_stats[datagram.path].won += 1
+                ready += in_order
+                discarded += unused
+                missing += lost
+            ready += self.reorder.expire(now)
+            self.transport.release(discarded)
+            if missing and self.relay:
+                self._send_nack(missing)
+            if not ready:
                 continue
+            # Sender timestamps come from the robot's clock (NTP-synced peers).
+            delay = time.time() - ready[-1].timestamp
+            self.latency = delay if self.latency is None else 0.9 * self.latency + 0.1 * delay
+            self._latency_histogram.observe(delay)
             try:
-                if self.ffmpeg_process.stdin:
-                    self.ffmpeg_process.stdin.write(data)
-                    self.ffmpeg_process.stdin.flush()  # Ensure data is sent immediately
+                views = []
+                for datagram in ready:
+                    if self._check_discontinuity(datagram):
+                        views = []  # Anything pending belongs to the stale stream.
+                    if self._resync_pending:
+                        if not datagram.flags & FLAG_KEYFRAME:
+                            continue
+                        self._activate_standby()
+                        psi = self.inspector.psi_packets()
+                        if psi:
+                            views.append(psi)
+                    views.append(datagram.payload)
+                if views and self.decoder:
+                    started = time.perf_counter()
+                    self.decoder.write(views)
+                    self._decoder_write.observe(time.perf_counter() - started)
             except Exception as e:
+                # A decoder that died mid-write is replaced at the next keyframe.
                 print(f"FFmpeg stdin write error: {e}")
-                break
+                self._begin_resync("decoder write failure")
+            finally:
+                self.transport.release(ready)
 
-    def _read_exactly(self, num_bytes):
-        """
-        Utility to read exactly num_bytes from FFmpeg's stdout.
+    def _check_discontinuity(self, datagram):
         """
-        data = b''
-        while len(data) < num_bytes:
-            chunk = self.ffmpeg_process.stdout.read(num_bytes - len(data))
-            if not chunk:
-                return None
-            data += chunk
-        return data
+        Update stream state with a datagram and start a resync if the stream restarted.
 
-    def _read_ffmpeg(self):
+        Returns:
+            bool: True if a resync was started by this datagram.
         """
-        Read raw video frames from FFmpeg's stdout.
-        Each frame has a fixed size: width * height * 3 bytes (BGR24).
-        """
-        frame_size = self.width * self.height * 3
-        while self._running:
+        if datagram.session_id != self.session_id:
+            restarted = self.session_id is not None
+            self.session_id = datagram.session_id
+            self._last_seq = None
+            self.inspector.reset()
+            if restarted:
+                self._begin_resync("new stream session")
+                self.inspector.inspect(datagram.payload)
+                return True
+
+        lost = 0
+        if self._last_seq is not None:
+            lost = (datagram.seq - self._last_seq - 1) & 0xFFFFFFFF
+        self._last_seq = datagram.seq
+
+        previous_pts = self.inspector.last_pts
+        errors, pts = self.inspector.inspect(datagram.payload)
+
+        if (pts is not None and previous_pts is not None
+                and abs(pts_delta(previous_pts, pts)) > self.PTS_JUMP_LIMIT):
+            return self._begin_resync("PTS jump")
+
+        # Continuity errors right after lost datagrams are expected; only count
+        # errors in datagrams that arrived in sequence.
+        now = time.monotonic()
+        if now - self._continuity_window >= 1.0:
+            self._continuity_window = now
+            self._continuity_errors = 0
+        if errors and not lost:
+            self._continuity_errors += errors
+            if self._continuity_errors >= self.CONTINUITY_ERROR_LIMIT:
+                self._continuity_errors = 0
+                return self._begin_resync("continuity errors")
+        return False
+
+    def _begin_resync(self, reason):
+        """Discard data until the next keyframe, then switch to the standby decoder."""
+        if self._resync_pending:
+            return False
+        print(f"Video stream discontinuity ({reason}); resyncing on next keyframe.")
+        self._resync_pending = True
+        self._resync_started = time.monotonic()
+        return True
+
+    def _spawn_standby(self):
+        """Pre-spawn a decoder so that a resync does not pay FFmpeg's startup cost."""
+        decoder = FFmpegDecoder(self.width, self.height, self._on_frame)
+        with self._standby_lock:
+            if self.standby is None and self._running:
+                self.standby = decoder
+                return
+        decoder.close()
+
+    def _activate_standby(self):
+        """Make the standby decoder active and retire the previous one."""
+        with self._standby_lock:
+            decoder, self.standby = self.standby, None
+        if decoder is None:
+            # Resyncs arrived faster than standbys could be spawned.
+            decoder = FFmpegDecoder(self.width, self.height, self._on_frame)
+        decoder.activated_at = time.monotonic()
+        self.last_standby_age = decoder.activated_at - decoder.spawned_at
+        previous, self.decoder = self.decoder, decoder
+        if previous:
+            previous.close()
+            self.resync_count += 1
+        if self._resync_started is None:
+            self._resync_started = time.monotonic()
+        self._awaiting_first_frame = True
+        self._resync_pending = False
+        threading.Thread(target=self._spawn_standby, daemon=True).start()
+
+    def _on_frame(self, decoder, frame):
+        """Handle a decoded frame; frames from retired decoders are discarded."""
+        if decoder is not self.decoder:
+            return
+        if self._awaiting_first_frame:
+            self._awaiting_first_frame = False
+            now = time.monotonic()
+            self.last_time_to_first_frame = now - self._resync_started
+            self.last_decoder_first_frame = now - decoder.activated_at
+            self._resync_started = None
+            print(f"First video frame {self.last_time_to_first_frame * 1000:.0f} ms after "
+                  f"stream (re)start, {self.last_decoder_first_frame * 1000:.0f} ms after the decoder "
+                  f"took over (warm for {self.last_standby_age:.1f} s; resyncs so far: {self.resync_count}).")
+        self.frames_decoded += 1
+        if self.recorder:
+            self.recorder.record(frame)
+        if self.decoded_frame_queue.full():
             try:
-                raw_frame = self._read_exactly(frame_size)
-                if raw_frame is None or len(raw_frame) != frame_size:
-                    continue
-                frame = np.frombuffer(raw_frame, dtype=np.uint8)
-                frame = frame.reshape((self.height, self.width, 3))
-                if self.recorder:
-                    self.recorder.record(frame)
-                if self.decoded_frame_queue.full():
-                    try:
-                        self.decoded_frame_queue.get_nowait()  # Remove oldest frame.
-                    except queue.Empty:
-                        pass
-                self.decoded_frame_queue.put(frame)
-            except Exception as e:
-                print(f"FFmpeg stdout read error: {e}")
-                break
+                self.decoded_frame_queue.get_nowait()  # Remove oldest frame.
+            except queue.Empty:
+                pass
+        self.decoded_frame_queue.put(frame)
+
+    def _recover(self, session_id, seq):
+        """Rebuild a datagram the reorder buffer is about to give up on, from parity."""
+        rebuilt = self.parity.recover(session_id, seq)
+        if rebuilt is not None:
+            self.path_stats[rebuilt.path].recovered += 1
+        return rebuilt
+
+    def path_report(self):
+        """Per-path statistics of a multipath stream, or None for a single path."""
+        if not self.path_stats:
+            return None
+        return [stats.as_dict() for stats in self.path_stats]
 
 class CommandSender:
     def __init__(self, message_ip="10.8.0.3", message_port=12345):
@@ -155,7 +580,7 @@ class CommandSender:
 
     def send_udp_message(self, command):
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        print(f"Sending command: {command}")
+        logger.debug("Sending command: %s", command)
         try:
             sock.sendto(command.encode(), (self.message_ip, self.message_port))
         except Exception as e:
@@ -1,4 +1,8 @@
+import os
+import time
 import cv2
+import metrics
+from s3_uploader import upload_file_to_s3
 
 class VideoRecorder:
     def __init__(self, output_filename, width, height, fps):
@@ -19,11 +23,40 @@ class VideoRecorder:
         self.writer = cv2.VideoWriter(output_filename, fourcc, 90, (width, height))
         if not self.writer.isOpened():
             raise RuntimeError("Failed to open video writer.")
+        self._frames = metrics.counter("recorder_frames_total", "Frames written to the recording.")
+        self._write_time = metrics.histogram("recorder_write_seconds", "Time to encode and write one frame.")
 
     def record(self, frame):
         """Write a frame to the video file."""
+        started = time.perf_counter()
         self.writer.write(frame)
+        self._write_time.observe(time.perf_counter() - started)
+        self._frames.inc()
 
     def stop(self):
         """Release the video writer."""
         self.writer.release()
+
+
+def finalize_recording(temp_filename, start_dt, end_dt, prefix="", bucket_name="surgery-robot-recordings"):
+    """
+    Rename a finished recording after its start/end time, upload it to S3 and remove it.
+
+    Args:
+        temp_filename (str): Path of the finished recording.
+        start_dt (datetime): When the recording started.
+        end_dt (datetime): When the recording ended.
+        prefix (str): Optional prefix (e.g. the session name) for the final filename.
+        bucket_name (str): Target S3 bucket name.
+    """
+    start_str = start_dt.strftime('%Y-%m-%d__%H-%M-%S')
+    end_time_str = end_dt.strftime('%H-%M-%S')
+    final_filename = f"{prefix}{start_str}__{end_time_str}.mp4"
+    os.rename(temp_filename, final_filename)
+    print("Recording saved as:", final_filename)
+
+    upload_file_to_s3(final_filename, bucket_name, final_filename)
+    print("Video uploaded to S3.")
+
+    os.remove(final_filename)
+    print("Local file removed.")
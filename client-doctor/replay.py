@@ -0,0 +1,248 @@
+import argparse
+import queue
+import socket
+import threading
+import time
+from capture import CaptureReader, CHANNEL_VIDEO
+from udp_transport import HEADER
+
+
+class Replayer:
+    def __init__(self, path, speed=1.0, channel=CHANNEL_VIDEO):
+        """
+        Feed a capture file back over UDP with its original inter-arrival timing.
+
+        Datagrams are sent in capture order, each at its original arrival
+        offset divided by `speed`; speed=0 sends as fast as possible. Sender
+        timestamps in video headers are shifted to the replay time, keeping
+        each datagram's recorded network delay, so latency figures stay
+        meaningful. Each datagram goes to the target of the network path it
+        was captured on, so multipath captures reach the receiver the same way.
+
+        Args:
+            path (str): Capture file written by CaptureWriter.
+            speed (float): 1.0 for real time, >1 accelerated, 0 for as fast as possible.
+            channel (int): Only datagrams captured on this channel are replayed.
+        """
+        self.path = path
+        self.speed = speed
+        self.channel = channel
+        self.sent = 0
+        self.bytes_sent = 0
+        self.max_lag = 0.0  # Largest delay behind schedule, in seconds.
+
+    def run(self, targets, throttle=None):
+        """
+        Send the capture to targets.
+
+        Args:
+            targets (list): (host, port) per captured path, in path order; a single
+                target receives the datagrams of every path.
+            throttle (callable): Called before each datagram; may block to apply
+                backpressure (used when replaying as fast as possible).
+
+        Returns:
+            float: Wall-clock seconds the replay took.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        reader = CaptureReader(self.path)
+        buf = bytearray(65536)
+        started = time.perf_counter()
+        first_arrival = None
+        try:
+            for arrival_ns, channel, path, datagram in reader:
+                if channel != self.channel:
+                    continue
+                if len(targets) == 1:
+                    target = targets[0]
+                elif path < len(targets):
+                    target = targets[path]
+                else:
+                    raise ValueError(f"Datagram captured on path {path}, but only "
+                                     f"{len(targets)} targets were given.")
+                if first_arrival is None:
+                    first_arrival = arrival_ns
+                if self.speed > 0:
+                    due = started + (arrival_ns - first_arrival) / 1e9 / self.speed
+                    wait = due - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+                    else:
+                        self.max_lag = max(self.max_lag, -wait)
+                if throttle:
+                    throttle()
+
+                length = len(datagram)
+                buf[:length] = datagram
+                if channel == CHANNEL_VIDEO and length >= HEADER.size:
+                    timestamp, session_id, seq, flags, size = HEADER.unpack_from(buf, 0)
+                    delay = arrival_ns / 1e9 - timestamp
+                    HEADER.pack_into(buf, 0, time.time() - delay, session_id, seq, flags, size)
+                sock.sendto(memoryview(buf)[:length], target)
+                self.sent += 1
+                self.bytes_sent += length
+        finally:
+            reader.close()
+            sock.close()
+        return time.perf_counter() - started
+
+
+class FrameConsumer:
+    def __init__(self, video_receiver, encode=False):
+        """
+        Drain decoded frames from a receiver, optionally JPEG-encoding each one
+        the way the VR server does, and time the encodes.
+
+        Args:
+            video_receiver (VideoStreamReceiver): The pipeline under test.
+            encode (bool): Also JPEG-encode every frame.
+        """
+        self.video_receiver = video_receiver
+        self.encode = encode
+        self.frames = 0
+        self.encode_seconds = 0.0
+        self.last_frame_time = None
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        import cv2
+        while self._running:
+            try:
+                frame = self.video_receiver.decoded_frame_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if self.encode:
+                started = time.perf_counter()
+                cv2.imencode('.jpg', frame)
+                self.encode_seconds += time.perf_counter() - started
+            self.frames += 1
+            self.last_frame_time = time.monotonic()
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+
+
+def capture_paths(path, channel=CHANNEL_VIDEO):
+    """Number of network paths the datagrams of a channel were captured on."""
+    reader = CaptureReader(path)
+    try:
+        return max((record_path for _, record_channel, record_path, _ in reader
+                    if record_channel == channel), default=0) + 1
+    finally:
+        reader.close()
+
+
+def replay_into_pipeline(path, speed, encode=False, max_queued_batches=8, settle=1.0, views=1):
+    """
+    Replay a capture into an in-process VideoStreamReceiver on loopback and
+    report what the pipeline did with it.
+
+    When replaying as fast as possible, sending pauses while the decoder feed
+    thread has more than max_queued_batches batches waiting, so that the run
+    measures pipeline throughput instead of kernel buffer overflows.
+    Stereo captures are replayed with views=2, so they decode at full width.
+    Multipath captures are replayed into a receiver with one address per path.
+
+    Returns:
+        dict: Replay and pipeline statistics.
+    """
+    # Imported here so that replaying into a running doctor needs neither OpenCV nor FFmpeg.
+    from network import VideoStreamReceiver
+
+    paths = capture_paths(path)
+    video_receiver = VideoStreamReceiver(host='127.0.0.1', port=0, views=views,
+                                         paths=[('127.0.0.1', 0)] * paths if paths > 1 else None)
+    video_receiver.start()
+    targets = [transport.socket.getsockname() for transport in video_receiver.transports]
+    consumer = FrameConsumer(video_receiver, encode=encode)
+
+    def throttle():
+        while video_receiver.mpeg_queue.qsize() > max_queued_batches:
+            time.sleep(0.001)
+
+    replayer = Replayer(path, speed)
+    started = time.monotonic()
+    replay_seconds = replayer.run(targets, throttle if speed <= 0 else None)
+
+    # Let the pipeline finish decoding what was sent.
+    while True:
+        time.sleep(settle / 4)
+        idle_since = consumer.last_frame_time or 0
+        if (video_receiver.mpeg_queue.empty()
+                and time.monotonic() - idle_since >= settle):
+            break
+    elapsed = (consumer.last_frame_time or time.monotonic()) - started
+    consumer.stop()
+    video_receiver._check_socket_drops()
+    video_receiver.stop()
+
+    return {
+        "datagrams_sent": replayer.sent,
+        "bytes_sent": replayer.bytes_sent,
+        "replay_seconds": replay_seconds,
+        "max_schedule_lag": replayer.max_lag,
+        "paths": paths,
+        "datagrams_received": sum(transport.packets_received for transport in video_receiver.transports),
+        "malformed": sum(transport.malformed for transport in video_receiver.transports),
+        "socket_drops": video_receiver.socket_drops,
+        "duplicates": video_receiver.reorder.duplicates,
+        "skipped": video_receiver.reorder.skipped,
+        "resyncs": video_receiver.resync_count,
+        "time_to_first_frame": video_receiver.last_time_to_first_frame,
+        "frames_decoded": video_receiver.frames_decoded,
+        "frames_consumed": consumer.frames,
+        "decode_fps": video_receiver.frames_decoded / elapsed if elapsed > 0 else None,
+        "encode_ms_per_frame": (1000 * consumer.encode_seconds / consumer.frames
+                                if encode and consumer.frames else None),
+    }
+
+
+def main():
+    """
+    Replay a session capture, e.g. to reproduce a field issue or benchmark a change:
+
+        python replay.py session.cap                     # real time, in-process pipeline
+        python replay.py session.cap --speed 8           # 8x accelerated
+        python replay.py session.cap --speed 0 --encode  # as fast as possible, with JPEG encode
+        python replay.py session.cap --target 127.0.0.1:1189  # into a running main.py
+        python replay.py session.cap --target 127.0.0.1:1189,127.0.0.1:1191  # one per path
+    """
+    parser = argparse.ArgumentParser(description="Replay a captured session.")
+    parser.add_argument("capture", help="capture file written with capture_path")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="1 = real time, N = N times faster, 0 = as fast as possible")
+    parser.add_argument("--target", default=None,
+                        help="host:port to send to instead of an in-process pipeline; "
+                             "comma-separated, one per path, for multipath captures")
+    parser.add_argument("--channel", type=int, default=CHANNEL_VIDEO,
+                        help="capture channel to replay (0 = video, 1 = commands)")
+    parser.add_argument("--encode", action="store_true",
+                        help="JPEG-encode decoded frames like the VR server")
+    parser.add_argument("--views", type=int, default=1,
+                        help="side-by-side camera views in the stream (2 = stereo)")
+    args = parser.parse_args()
+
+    if args.target:
+        targets = []
+        for target in args.target.split(","):
+            host, port = target.rsplit(":", 1)
+            targets.append((host, int(port)))
+        replayer = Replayer(args.capture, args.speed, args.channel)
+        seconds = replayer.run(targets)
+        print(f"Replayed {replayer.sent} datagrams ({replayer.bytes_sent} bytes) in {seconds:.2f} s; "
+              f"max lag behind schedule {replayer.max_lag * 1000:.1f} ms.")
+        return
+
+    stats = replay_into_pipeline(args.capture, args.speed, encode=args.encode, views=args.views)
+    width = max(len(key) for key in stats)
+    for key, value in stats.items():
+        if isinstance(value, float):
+            value = f"{value:.4f}"
+        print(f"{key:<{width}}  {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import os
+import re
+import time
+import pytz
+import datetime
+import ipaddress
+import threading
+import multiprocessing
+import queue
+
+# Worker processes are spawned rather than forked: the parent runs Flask and
+# several threads, which must not be duplicated into the children.
+_mp = multiprocessing.get_context('spawn')
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+# Session names end up in recording file names and S3 keys.
+_SESSION_NAME = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+
+class SessionExists(ValueError):
+    """A session with the requested name is already running."""
+
+
+class SessionConfig:
+    def __init__(self, session_id, name, video_port, vr_port, robot_ip,
+                 command_port=12345, relay=None, heartbeat_port=12346, views=1):
+        """
+        Everything one robot session needs: its ports and its robot's WireGuard address.
+
+        Args:
+            session_id (int): Index of the session; also used for port allocation.
+            name (str): Human-readable name (e.g. the theatre).
+            video_port (int): UDP port receiving this robot's video.
+            vr_port (int): Port of this session's VR Socket.IO server.
+            robot_ip (str): WireGuard address of the robot (command target).
+            command_port (int): The robot's UDP command port.
+            relay (tuple): Relay subscribe address, if the stream comes via the hub.
+            heartbeat_port (int): The robot's heartbeat port.
+            views (int): Camera views in the robot's stream (2 for a stereo pair).
+        """
+        self.session_id = session_id
+        self.name = name
+        self.video_port = video_port
+        self.vr_port = vr_port
+        self.robot_ip = robot_ip
+        self.command_port = command_port
+        self.relay = relay
+        self.heartbeat_port = heartbeat_port
+        self.views = views
+
+    def wireguard_peer(self):
+        """The [Peer] stanza to add to the hub's wg0.conf for this session's robot."""
+        return (f"[Peer]\n"
+                f"# Robot for session '{self.name}'\n"
+                f"PublicKey = <public key of the robot client>\n"
+                f"AllowedIPs = {self.robot_ip}/32\n")
+
+
+def run_session(config, status_queue, stop_event, finalizing_event):
+    """
+    Worker process entry point: receive, decode, record and serve one robot session.
+
+    Reports fps, latency and resync figures to status_queue once per second
+    until stop_event is set, then sets finalizing_event and finalizes the
+    recording.
+    """
+    # Imported here so that the control-room process does not load cv2/FFmpeg machinery.
+    from network import VideoStreamReceiver, CommandSender
+    from recorder import VideoRecorder, finalize_recording
+    from vr import VRStreamingServer
+    from heartbeat import HeartbeatMonitor
+
+    os.environ['TZ'] = 'Europe/Sofia'
+    time.tzset()
+    tz = pytz.timezone('Europe/Sofia')
+    start_dt = datetime.datetime.now(tz)
+
+    video_receiver = VideoStreamReceiver(host='0.0.0.0', port=config.video_port,
+                                         relay=config.relay, subscriber_name=config.name,
+                                         views=config.views)
+    temp_filename = f"recording_{config.session_id}_temp.mp4"
+    recorder = VideoRecorder(temp_filename, video_receiver.width, video_receiver.height,
+                             video_receiver.framerate)
+    video_receiver.recorder = recorder
+    video_receiver.start()
+
+    command_sender = CommandSender(config.robot_ip, config.command_port)
+    heartbeat = HeartbeatMonitor(config.robot_ip, config.heartbeat_port)
+    heartbeat.start()
+    vr_server = VRStreamingServer(video_receiver, host='0.0.0.0', port=config.vr_port,
+                                  command_sender=command_sender, heartbeat=heartbeat)
+    threading.Thread(target=vr_server.run, daemon=True).start()
+    print(f"[{config.name}] video on UDP {config.video_port}, VR on port {config.vr_port}, "
+          f"robot at {config.robot_ip}.")
+
+    last_frames = 0
+    last_report = time.monotonic()
+    try:
+        while not stop_event.wait(1.0):
+            now = time.monotonic()
+            frames = video_receiver.frames_decoded
+            status_queue.put({
+                "session_id": config.session_id,
+                "pid": os.getpid(),
+                "fps": (frames - last_frames) / (now - last_report),
+                "latency": video_receiver.latency,
+                "resyncs": video_receiver.resync_count,
+                "time_to_first_frame": video_receiver.last_time_to_first_frame,
+                "decoder_first_frame": video_receiver.last_decoder_first_frame,
+                "socket_drops": video_receiver.socket_drops,
+                "paths": video_receiver.path_report(),
+                "link": heartbeat.link_quality(),
+            })
+            last_frames, last_report = frames, now
+    except KeyboardInterrupt:
+        pass  # The control room handles shutdown.
+
+    heartbeat.stop()
+    video_receiver.stop()
+    recorder.stop()
+    finalizing_event.set()
+    finalize_recording(temp_filename, start_dt, datetime.datetime.now(tz),
+                       prefix=f"{config.name}__")
+
+
+def _process_tree_cpu_seconds(pid):
+    """Total user+system CPU time of a process and all its descendants (e.g. FFmpeg)."""
+    total = 0.0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/stat") as f:
+                # Fields after the parenthesised command name; utime/stime are 14 and 15.
+                fields = f.read().rsplit(')', 1)[1].split()
+            total += (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError, IndexError):
+            continue
+    return total
+
+
+class SessionManager:
+    def __init__(self, base_video_port=1189, base_vr_port=5000,
+                 peer_network='10.8.0.0/24', reserved_peers=('10.8.0.1', '10.8.0.2'),
+                 relay=None):
+        """
+        Run several robot sessions on one workstation, one worker process each.
+
+        Each session gets the next free index, which determines its video and VR
+        ports (base + index), and the next free WireGuard address for its robot.
+        Workers report status over a queue; CPU usage is measured from /proc for
+        each worker and its FFmpeg children.
+
+        Args:
+            base_video_port (int): Video port of the first session.
+            base_vr_port (int): VR port of the first session.
+            peer_network (str): WireGuard network robot addresses are allocated from.
+            reserved_peers (tuple): Addresses never allocated (hub, doctor workstation).
+            relay (tuple): Relay subscribe address passed to every session, or None.
+        """
+        self.base_video_port = base_video_port
+        self.base_vr_port = base_vr_port
+        self.peer_network = ipaddress.ip_network(peer_network)
+        self.reserved_peers = set(reserved_peers)
+        self.relay = relay
+
+        self.sessions = {}
+        self._lock = threading.Lock()
+        self._status_queue = _mp.Queue()
+        self._reports = {}
+        self._cpu = {}
+        self._running = True
+        threading.Thread(target=self._collect_status, daemon=True).start()
+
+    def _allocate_peer(self, used):
+        for address in self.peer_network.hosts():
+            address = str(address)
+            if address not in self.reserved_peers and address not in used:
+                return address
+        raise RuntimeError(f"No free WireGuard address left in {self.peer_network}.")
+
+    def create_session(self, name, robot_ip=None, views=1):
+        """
+        Allocate ports and a robot address for a new session and start its worker.
+
+        Args:
+            name (str): Session name: 1-64 letters, digits, '_' or '-', unique among running sessions.
+            robot_ip (str): The robot's WireGuard address, if already assigned.
+            views (int): Camera views in the robot's stream (2 for a stereo pair).
+
+        Returns:
+            SessionConfig: The new session's configuration.
+        """
+        if not isinstance(name, str) or not _SESSION_NAME.fullmatch(name):
+            raise ValueError(f"Session name must be 1-64 letters, digits, '_' or '-', got {name!r}.")
+        if not isinstance(views, int) or views < 1:
+            raise ValueError(f"views must be a positive integer, got {views!r}.")
+        if robot_ip is not None:
+            if not isinstance(robot_ip, str):
+                raise TypeError(f"robot_ip must be a string, got {type(robot_ip).__name__}.")
+            robot_ip = str(ipaddress.ip_address(robot_ip))
+        with self._lock:
+            if any(session["config"].name == name for session in self.sessions.values()):
+                raise SessionExists(f"A session named '{name}' is already running.")
+            session_id = 0
+            while session_id in self.sessions:
+                session_id += 1
+            used = {session["config"].robot_ip for session in self.sessions.values()}
+            if robot_ip is None:
+                robot_ip = self._allocate_peer(used)
+            elif robot_ip in used:
+                raise ValueError(f"Robot {robot_ip} is already served by another session.")
+            config = SessionConfig(session_id, name,
+                                   video_port=self.base_video_port + session_id,
+                                   vr_port=self.base_vr_port + session_id,
+                                   robot_ip=robot_ip, relay=self.relay, views=views)
+            stop_event = _mp.Event()
+            finalizing_event = _mp.Event()
+            process = _mp.Process(target=run_session,
+                                  args=(config, self._status_queue, stop_event, finalizing_event),
+                                  name=f"session-{name}", daemon=False)
+            process.start()
+            self.sessions[session_id] = {"config": config, "process": process,
+                                         "stop_event": stop_event, "finalizing_event": finalizing_event,
+                                         "started": time.time()}
+        print(f"Session '{name}' started (pid {process.pid}); hub peer entry:\n"
+              f"{config.wireguard_peer()}")
+        return config
+
+    def stop_session(self, session_id, timeout=30, finalize_timeout=1800):
+        """
+        Stop a session's worker and wait for it to finalize its recording.
+
+        The worker gets `timeout` seconds to shut its pipeline down. Once it
+        reports that it is finalizing, renaming and uploading the recording
+        get up to `finalize_timeout` seconds more; only a worker that misses
+        its deadline is terminated.
+        """
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            return
+        process = session["process"]
+        session["stop_event"].set()
+        process.join(timeout)
+        if process.is_alive() and session["finalizing_event"].is_set():
+            print(f"Session '{session['config'].name}' is uploading its recording...")
+            process.join(finalize_timeout)
+        if process.is_alive():
+            print(f"Session '{session['config'].name}' did not finish in time; terminating it.")
+            process.terminate()
+        self._reports.pop(session_id, None)
+        self._cpu.pop(session_id, None)
+
+    def stop_all(self):
+        """Stop every session."""
+        for session_id in list(self.sessions):
+            self.stop_session(session_id)
+        self._running = False
+
+    def get(self, session_id):
+        """Return the configuration of a running session, or None."""
+        session = self.sessions.get(session_id)
+        return session["config"] if session else None
+
+    def _collect_status(self):
+        """Gather worker reports and sample per-session CPU usage."""
+        while self._running:
+            try:
+                report = self._status_queue.get(timeout=1.0)
+            except queue.Empty:
+                report = None
+            if report is not None:
+                with self._lock:
+                    # A stopped worker may still have a report queued; its session
+                    # ID may even have been reused by a new worker since.
+                    session = self.sessions.get(report["session_id"])
+                    if session is not None and session["process"].pid == report["pid"]:
+                        self._reports[report["session_id"]] = report
+            now = time.monotonic()
+            for session_id, session in list(self.sessions.items()):
+                cpu_seconds = _process_tree_cpu_seconds(session["process"].pid)
+                previous = self._cpu.get(session_id)
+                if previous is None or now - previous[0] >= 1.0:
+                    percent = None
+                    if previous is not None:
+                        percent = 100.0 * (cpu_seconds - previous[1]) / (now - previous[0])
+                    self._cpu[session_id] = (now, cpu_seconds, percent)
+
+    def status(self):
+        """Per-session status: ports, robot, fps, latency, CPU and recovery figures."""
+        result = []
+        for session_id, session in sorted(self.sessions.items()):
+            config = session["config"]
+            report = self._reports.get(session_id, {})
+            cpu = self._cpu.get(session_id)
+            result.append({
+                "session_id": session_id,
+                "name": config.name,
+                "robot_ip": config.robot_ip,
+                "video_port": config.video_port,
+                "vr_port": config.vr_port,
+                "alive": session["process"].is_alive(),
+                "uptime": time.time() - session["started"],
+                "fps": report.get("fps"),
+                "latency": report.get("latency"),
+                "cpu_percent": cpu[2] if cpu else None,
+                "resyncs": report.get("resyncs"),
+                "time_to_first_frame": report.get("time_to_first_frame"),
+                "decoder_first_frame": report.get("decoder_first_frame"),
+                "socket_drops": report.get("socket_drops"),
+                "paths": report.get("paths"),
+                "link": report.get("link"),
+            })
+        return result
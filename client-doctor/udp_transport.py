@@ -0,0 +1,487 @@
+import os
+import queue
+import socket
+import struct
+import time
+from collections import OrderedDict
+
+# Datagram header: timestamp (double), stream session ID, sequence number,
+# flags and chunk size. The session ID changes whenever the robot restarts its
+# encoder, so the receiver can tell a new stream from packet loss.
+HEADER = struct.Struct('<dIIHH')
+FLAG_KEYFRAME = 0x1  # Chunk contains the start of a keyframe (random access point).
+FLAG_PARITY = 0x2    # XOR parity over a group of chunks; seq is the group's first seq.
+
+# Prefix of a parity payload: group size, XOR of the chunk sizes and XOR of
+# their flags, followed by the XOR of the (zero-padded) chunk payloads.
+PARITY_HEADER = struct.Struct('<HHH')
+
+
+def set_socket_buffer(sock, option, size):
+    """
+    Request a kernel socket buffer size and return the size actually granted.
+
+    Args:
+        sock (socket.socket): The socket to configure.
+        option (int): socket.SO_SNDBUF or socket.SO_RCVBUF.
+        size (int): Requested size in bytes, or None to keep the default.
+    """
+    if size:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, option, size)
+        except OSError as e:
+            print(f"Failed to set socket buffer to {size} bytes: {e}")
+    try:
+        granted = sock.getsockopt(socket.SOL_SOCKET, option)
+    except OSError:
+        return None
+    if size and granted < size:
+        print(f"Kernel granted {granted} bytes of socket buffer (requested {size}); "
+              "raise net.core.rmem_max to allow more.")
+    return granted
+
+
+def read_socket_drops(sock):
+    """
+    Read the kernel drop counter for a UDP socket from /proc/net/udp.
+    The socket is matched by inode. Returns None if unavailable.
+    """
+    try:
+        inode = os.fstat(sock.fileno()).st_ino
+    except OSError:
+        return None
+    for path in ('/proc/net/udp', '/proc/net/udp6'):
+        try:
+            with open(path) as f:
+                next(f, None)  # Skip the column header.
+                for line in f:
+                    fields = line.split()
+                    if len(fields) >= 13 and int(fields[9]) == inode:
+                        return int(fields[12])
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+class BufferPool:
+    def __init__(self, count, size):
+        """
+        Fixed pool of preallocated receive buffers.
+
+        Args:
+            count (int): Number of buffers in the pool.
+            size (int): Size of each buffer in bytes.
+        """
+        self.size = size
+        self._free = queue.Queue()
+        for _ in range(count):
+            self._free.put(bytearray(size))
+
+    def acquire(self, timeout=None):
+        """Take a free buffer, blocking while all buffers are in flight."""
+        return self._free.get(timeout=timeout)
+
+    def release(self, buf):
+        """Return a buffer to the pool."""
+        self._free.put(buf)
+
+
+class Datagram:
+    __slots__ = ('buffer', 'payload', 'timestamp', 'session_id', 'seq', 'flags', 'path')
+
+    def __init__(self, buffer, payload, timestamp, session_id, seq, flags, path=0):
+        self.buffer = buffer
+        self.payload = payload
+        self.timestamp = timestamp
+        self.session_id = session_id
+        self.seq = seq
+        self.flags = flags
+        self.path = path  # Index of the network path it arrived on.
+
+
+class DatagramReceiver:
+    def __init__(self, host, port, rcvbuf=None, pool_size=512, max_datagram=8192,
+                 batch_size=32, timeout=0.5, capture=None, pool=None, path=0):
+        """
+        Receive timestamped chunks into preallocated buffers.
+
+        Datagrams are read with recv_into, so no per-packet bytes objects are
+        allocated, and payloads are exposed as memoryviews into the pooled
+        buffer. After a blocking receive, any further datagrams already queued
+        in the kernel are drained without blocking, so one call returns a batch.
+        Callers must hand the batch back with release() once consumed. If the
+        pool stays empty for `timeout`, the call returns what it has so the
+        caller can check whether it should stop; such waits are counted in
+        pool_exhausted while the datagrams stay queued in the kernel.
+
+        With a capture writer, every datagram (including malformed ones) is
+        recorded with its arrival time and this receiver's path index right
+        after it is read from the socket.
+
+        Args:
+            host (str): Address to bind.
+            port (int): Port to bind.
+            rcvbuf (int): Requested SO_RCVBUF size in bytes.
+            pool_size (int): Number of preallocated datagram buffers.
+            max_datagram (int): Size of each buffer.
+            batch_size (int): Maximum datagrams returned per call.
+            timeout (float): Seconds to wait for the first datagram of a batch.
+            capture (CaptureWriter): Records received datagrams, or None.
+        """
+        self.batch_size = batch_size
+        self.capture = capture
+        self.path = path
+        self.timeout = timeout
+        self.pool = pool if pool is not None else BufferPool(pool_size, max_datagram)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.rcvbuf = set_socket_buffer(self.socket, socket.SO_RCVBUF, rcvbuf)
+        self.socket.bind((host, port))
+        self.packets_received = 0
+        self.bytes_received = 0
+        self.malformed = 0
+        self.pool_exhausted = 0
+
+    def _parse(self, buf, nbytes):
+        """Validate a datagram and return a Datagram view of it, or None."""
+        if nbytes < HEADER.size:
+            return None
+        timestamp, session_id, seq, flags, size = HEADER.unpack_from(buf, 0)
+        if size != nbytes - HEADER.size:
+            return None
+        return Datagram(buf, memoryview(buf)[HEADER.size:nbytes], timestamp, session_id, seq, flags,
+                        self.path)
+
+    def receive_batch(self):
+        """
+        Wait for at least one datagram and return all that are ready.
+
+        Returns:
+            list[Datagram]: Received datagrams (empty on timeout or an exhausted pool).
+        """
+        batch = []
+        self.socket.settimeout(self.timeout)
+        while len(batch) < self.batch_size:
+            try:
+                # With a partial batch in hand, return it rather than wait for buffers.
+                buf = self.pool.acquire(timeout=0 if batch else self.timeout)
+            except queue.Empty:
+                self.pool_exhausted += 1
+                break
+            try:
+                nbytes = self.socket.recv_into(buf)
+            except (socket.timeout, BlockingIOError):
+                self.pool.release(buf)
+                break
+            except OSError:
+                self.pool.release(buf)
+                if batch:
+                    break
+                raise
+            if self.capture is not None:
+                self.capture.write(buf, nbytes, arrival_ns=time.time_ns(), path=self.path)
+            datagram = self._parse(buf, nbytes)
+            if datagram is None:
+                self.malformed += 1
+                self.pool.release(buf)
+            else:
+                self.packets_received += 1
+                self.bytes_received += nbytes
+                batch.append(datagram)
+            # Drain whatever else is already queued without blocking.
+            self.socket.setblocking(False)
+        return batch
+
+    def release(self, batch):
+        """Return the buffers of a consumed batch to the pool."""
+        for datagram in batch:
+            datagram.payload.release()
+            self.pool.release(datagram.buffer)
+
+    def drops(self):
+        """Kernel drop counter for the receiving socket."""
+        return read_socket_drops(self.socket)
+
+    def close(self):
+        """Close the UDP socket."""
+        self.socket.close()
+
+
+class ReorderBuffer:
+    SEQ_MASK = 0xFFFFFFFF
+    SEQ_HALF = 0x80000000
+    MAX_MISSING = 64
+
+    def __init__(self, delay=0.0, max_pending=256, recover=None):
+        """
+        Restore the sequence order of datagrams and drop duplicates.
+
+        When a gap appears, later datagrams are held for up to `delay` seconds so
+        that a retransmission can fill it; after that the gap is skipped. With
+        delay=0 gaps are skipped immediately, so only duplicates and late
+        datagrams are filtered out.
+
+        Before a gap is skipped, `recover` is asked for each missing datagram,
+        so forward error correction only steps in once the original is overdue.
+
+        Args:
+            delay (float): Seconds to wait for a missing datagram.
+            max_pending (int): Held datagrams after which a gap is skipped early.
+            recover (callable): Called as recover(session_id, seq) for a missing
+                datagram about to be given up on; returns a rebuilt Datagram or None.
+        """
+        self.delay = delay
+        self.max_pending = max_pending
+        self.recover = recover
+        self.session_id = None
+        self.next_seq = None
+        self._high_next = None
+        self._pending = {}
+        self._gap_since = None
+        self.duplicates = 0
+        self.skipped = 0
+        self.recovered = 0
+
+    def push(self, datagram, now):
+        """
+        Add a datagram.
+
+        Returns:
+            tuple: (ready, discarded, missing) — datagrams to process in order,
+                   datagrams to release unused, and newly detected missing
+                   sequence numbers.
+        """
+        ready, discarded, missing = [], [], []
+        if datagram.session_id != self.session_id:
+            # A new stream: hand over whatever the old one still had held back.
+            ready.extend(self._pending[seq] for seq in sorted(self._pending, key=self._offset))
+            self._pending.clear()
+            self._gap_since = None
+            self.session_id = datagram.session_id
+            self.next_seq = self._high_next = datagram.seq
+
+        seq = datagram.seq
+        offset = self._offset(seq)
+        if offset >= self.SEQ_HALF or seq in self._pending:
+            self.duplicates += 1
+            discarded.append(datagram)
+            return ready, discarded, missing
+
+        ahead = (seq - self._high_next) & self.SEQ_MASK
+        if ahead < self.SEQ_HALF:
+            missing = [(self._high_next + i) & self.SEQ_MASK
+                       for i in range(min(ahead, self.MAX_MISSING))]
+            self._high_next = (seq + 1) & self.SEQ_MASK
+
+        if offset == 0:
+            ready.append(datagram)
+            self.next_seq = (seq + 1) & self.SEQ_MASK
+            self._release_contiguous(ready)
+        else:
+            if not self._pending:
+                self._gap_since = now
+            self._pending[seq] = datagram
+            if self.delay <= 0 or len(self._pending) > self.max_pending:
+                while self._pending and (self.delay <= 0 or len(self._pending) > self.max_pending):
+                    self._skip_gap(ready)
+        return ready, discarded, missing
+
+    def expire(self, now):
+        """Skip gaps that have been waited on for longer than the delay; returns ready datagrams."""
+        ready = []
+        if self._pending and now - self._gap_since >= self.delay:
+            self._skip_gap(ready)
+            if self._pending:
+                self._gap_since = now  # The next gap gets its own full delay.
+        return ready
+
+    def _offset(self, seq):
+        return (seq - self.next_seq) & self.SEQ_MASK
+
+    def _skip_gap(self, ready):
+        """Give up on the current gap and continue from the next held datagram."""
+        first = min(self._pending, key=self._offset)
+        gap = self._offset(first)
+        if self.recover is not None:
+            for i in range(min(gap, self.MAX_MISSING)):
+                rebuilt = self.recover(self.session_id, (self.next_seq + i) & self.SEQ_MASK)
+                if rebuilt is not None:
+                    ready.append(rebuilt)
+                    self.recovered += 1
+                    gap -= 1
+        self.skipped += gap
+        self.next_seq = first
+        self._release_contiguous(ready)
+
+    def _release_contiguous(self, ready):
+        while self.next_seq in self._pending:
+            ready.append(self._pending.pop(self.next_seq))
+            self.next_seq = (self.next_seq + 1) & self.SEQ_MASK
+        if not self._pending:
+            self._gap_since = None
+
+
+class ParityRecovery:
+    def __init__(self, pool, max_groups=64):
+        """
+        Rebuild single lost datagrams from the XOR parity a multipath sender
+        sends alongside them.
+
+        Data datagrams are folded into per-group accumulators as they pass (the
+        payloads themselves are not kept). Nothing is rebuilt on arrival: parity
+        often comes in over a faster path before the group's last data chunk.
+        Instead the ReorderBuffer calls recover() for a datagram it is about to
+        give up on; if that datagram's group has its parity and only that one
+        datagram missing, it is rebuilt into a buffer from the pool. The group
+        size is learned from the parity datagrams, so data is only tracked once
+        the first parity has arrived.
+
+        Args:
+            pool (BufferPool): Pool for the buffers of rebuilt datagrams.
+            max_groups (int): Groups tracked at most; older ones are forgotten.
+        """
+        self.pool = pool
+        self.max_groups = max_groups
+        self.group_size = None
+        self._groups = OrderedDict()
+        self.recovered = 0
+        self.unrecoverable = 0  # Overdue datagrams that could not be rebuilt.
+
+    def _group(self, session_id, first_seq):
+        key = (session_id, first_seq)
+        group = self._groups.get(key)
+        if group is None:
+            # [payload XOR, size XOR, flags XOR, seqs seen, parity datagram state]
+            group = [0, 0, 0, set(), None]
+            self._groups[key] = group
+            if len(self._groups) > self.max_groups:
+                self._groups.popitem(last=False)
+        return group
+
+    def push(self, datagram):
+        """
+        Account for a datagram.
+
+        Parity datagrams are consumed here and must not be decoded.
+        """
+        if datagram.flags & FLAG_PARITY:
+            payload = datagram.payload
+            if len(payload) < PARITY_HEADER.size:
+                return None
+            count, sizes, flags = PARITY_HEADER.unpack_from(payload, 0)
+            if not count:
+                return
+            self.group_size = count
+            group = self._group(datagram.session_id, datagram.seq)
+            group[4] = (int.from_bytes(payload[PARITY_HEADER.size:], 'little'), sizes, flags,
+                        len(payload) - PARITY_HEADER.size, datagram.timestamp, datagram.path)
+        else:
+            if self.group_size is None:
+                return
+            first_seq = datagram.seq - datagram.seq % self.group_size
+            group = self._group(datagram.session_id, first_seq)
+            if datagram.seq in group[3]:
+                return
+            group[0] ^= int.from_bytes(datagram.payload, 'little')
+            group[1] ^= len(datagram.payload)
+            group[2] ^= datagram.flags
+            group[3].add(datagram.seq)
+            if len(group[3]) == self.group_size:
+                del self._groups[(datagram.session_id, first_seq)]
+
+    def recover(self, session_id, seq):
+        """
+        Rebuild an overdue datagram from its group's parity.
+
+        Returns:
+            Datagram: The rebuilt datagram, or None if its group lacks the parity,
+                      misses more than this datagram, or no buffer is free.
+        """
+        if self.group_size is None:
+            return None  # No parity in this stream (yet).
+        first_seq = seq - seq % self.group_size
+        group = self._groups.get((session_id, first_seq))
+        if (group is None or group[4] is None or seq in group[3]
+                or len(group[3]) != self.group_size - 1):
+            self.unrecoverable += 1
+            return None
+        parity, sizes, flags, width, timestamp, path = group[4]
+        size = sizes ^ group[1]
+        if size > width or HEADER.size + size > self.pool.size:
+            self.unrecoverable += 1
+            return None
+        try:
+            # Never wait: this runs on the feed thread, which is the one that
+            # returns buffers to the pool.
+            buf = self.pool.acquire(timeout=0)
+        except queue.Empty:
+            self.unrecoverable += 1
+            return None
+        del self._groups[(session_id, first_seq)]
+        HEADER.pack_into(buf, 0, timestamp, session_id, seq, flags ^ group[2], size)
+        buf[HEADER.size:HEADER.size + size] = (parity ^ group[0]).to_bytes(width, 'little')[:size]
+        self.recovered += 1
+        return Datagram(buf, memoryview(buf)[HEADER.size:HEADER.size + size], timestamp,
+                        session_id, seq, flags ^ group[2], path)
+
+
+class PathStats:
+    def __init__(self, index, address):
+        """
+        Loss, delay and race statistics of one network path.
+
+        Loss is estimated from the sequence numbers seen on the path: data
+        datagrams advance by one, parity datagrams by the parity group size.
+
+        Args:
+            index (int): Path index.
+            address (tuple): Local (host, port) the path is received on.
+        """
+        self.index = index
+        self.address = address
+        self.received = 0
+        self.expected = 0
+        self.latency = None  # Smoothed sender-to-receiver delay in seconds.
+        self.won = 0         # Datagrams whose first copy arrived on this path.
+        self.lost_race = 0   # Copies that arrived after another path's.
+        self.recovered = 0   # Datagrams rebuilt from this path's parity.
+        self._session_id = None
+        self._last_seq = {}  # Per datagram kind (data, parity).
+
+    def update(self, datagram, now, parity_group=1):
+        """Account for a datagram received on this path (receive thread only)."""
+        kind = datagram.flags & FLAG_PARITY
+        if datagram.session_id != self._session_id:
+            self._session_id = datagram.session_id
+            self._last_seq.clear()
+        last = self._last_seq.get(kind)
+        if last is None:
+            self.expected += 1
+            self._last_seq[kind] = datagram.seq
+        else:
+            step = (parity_group or 1) if kind else 1
+            ahead = (datagram.seq - last) & 0xFFFFFFFF
+            if 0 < ahead < 0x80000000:
+                self.expected += max(1, ahead // step)
+                self._last_seq[kind] = datagram.seq
+        self.received += 1
+        delay = now - datagram.timestamp
+        self.latency = delay if self.latency is None else 0.9 * self.latency + 0.1 * delay
+
+    @property
+    def loss(self):
+        """Fraction of the datagrams sent on this path that did not arrive."""
+        if not self.expected:
+            return None
+        return max(0, self.expected - self.received) / self.expected
+
+    def as_dict(self):
+        return {
+            "path": self.index,
+            "address": f"{self.address[0]}:{self.address[1]}",
+            "received": self.received,
+            "loss": self.loss,
+            "latency": self.latency,
+            "won": self.won,
+            "lost_race": self.lost_race,
+            "recovered": self.recovered,
+        }
@@ -3,9 +3,10 @@ import base64
 import time
 import logging
 import threading
+import metrics
 from network import CommandSender
 
-from flask import Flask, request, send_file
+from flask import Flask, Response, request, send_file
 from flask_socketio import SocketIO, emit
 
 # Configure the logger for this module.
@@ -13,7 +14,7 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(me
 logger = logging.getLogger(__name__)
 
 class VRStreamingServer:
-    def __init__(self, video_receiver, host='0.0.0.0', port=5000):
+    def __init__(self, video_receiver, host='0.0.0.0', port=5000, command_sender=None, heartbeat=None):
         """
         A Socket.IO–based VR Streaming Server using A-Frame.
 
@@ -23,11 +24,16 @@ class VRStreamingServer:
                 plus a ._running bool controlling frame flow.
             host (str): Host to bind the Flask server to.
             port (int): Port to listen on.
+            command_sender (CommandSender): Sends control messages to this session's
+                robot; defaults to the single-robot address.
+            heartbeat (HeartbeatMonitor): Source of the link-quality figures
+                pushed to clients as 'link_quality' events, or None.
         """
         self.video_receiver = video_receiver
         self.host = host
         self.port = port
-        self.command_sender = CommandSender()
+        self.command_sender = command_sender or CommandSender()
+        self.heartbeat = heartbeat
 
         # Create Flask + SocketIO App
         self.app = Flask(__name__)
@@ -35,22 +41,46 @@ class VRStreamingServer:
 
         self.socketio = SocketIO(self.app, async_mode='threading', cors_allowed_origins='*')
 
+        self.clients = 0
+        metrics.gauge("vr_clients", "Connected Socket.IO clients.", fn=lambda: self.clients)
+        self._frames_sent = metrics.counter("vr_frames_sent_total", "Frames emitted to VR clients.")
+        self._encode_time = metrics.histogram("vr_jpeg_encode_seconds", "Time to JPEG+base64 encode one frame.")
+        self._control_messages = metrics.counter("vr_control_messages_total", "Controller messages forwarded.")
+
         @self.app.route('/')
         def index():
             return send_file('vr.html')
 
+        @self.app.route('/metrics')
+        def metrics_endpoint():
+            return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+        @self.app.route('/profile')
+        def profile():
+            # Sample all threads for ?seconds=N and return collapsed stacks for a flame graph.
+            try:
+                seconds = min(float(request.args.get('seconds', 10)), 120.0)
+                stacks = metrics.sample_profile(seconds)
+            except (ValueError, RuntimeError) as e:
+                return Response(f"{e}\n", status=409, mimetype='text/plain')
+            return Response(stacks, mimetype='text/plain', headers={
+                'Content-Disposition': f'attachment; filename="doctor-{int(time.time())}.folded"'})
+
         # Socket.IO events
         @self.socketio.on('connect')
         def on_connect():
+            self.clients += 1
             logger.info('[Socket.IO] Client connected.')
 
         @self.socketio.on('disconnect') 
         def on_disconnect():
+            self.clients -= 1
             logger.info('[Socket.IO] Client disconnected.')
 
         @self.socketio.on('control_message')
         def on_control_message(data):
-            logger.info('[Socket.IO] Received control message: %s', data)
+            logger.debug('[Socket.IO] Received control message: %s', data)
+            self._control_messages.inc()
             self.command_sender.send_udp_message(data)
 
 
@@ -58,6 +88,8 @@ class VRStreamingServer:
         def on_start_connection(data):
             logger.info('[Socket.IO] Received start_connection message: %s', data)
             sid = request.sid
+            # Tells the page how many side-by-side views each frame holds (2 = stereo).
+            emit('stream_info', {'views': self.video_receiver.views})
             threading.Thread(target=self.broadcast_frames, args=(sid,), daemon=True).start()
 
   
@@ -80,20 +112,35 @@ class VRStreamingServer:
                   self.socketio.sleep(0.1)
                   continue
 
+              started = time.perf_counter()
               success, jpeg = cv2.imencode('.jpg', frame)
               if not success:
                   logger.warning("Failed to encode frame to JPEG.")
                   continue
               
               encoded = base64.b64encode(jpeg.tobytes()).decode('utf-8')
+              self._encode_time.observe(time.perf_counter() - started)
               frame_count += 1
-              self.socketio.emit('video_frame', encoded, to=sid, callback=(lambda: print("Frame sent.")))
+              self.socketio.emit('video_frame', encoded, to=sid)
+              self._frames_sent.inc()
               self.socketio.sleep(0.03)
     
+    def broadcast_link_quality(self, interval=0.2):
+        """Push the heartbeat's link-quality figures to all clients a few times per second."""
+        while self.video_receiver._running:
+            if self.clients:
+                quality = self.heartbeat.link_quality()
+                quality["video_latency_ms"] = (self.video_receiver.latency * 1000
+                                               if self.video_receiver.latency is not None else None)
+                self.socketio.emit('link_quality', quality)
+            self.socketio.sleep(interval)
+
     def run(self):
         """
         Start the Socket.IO server. This should be run on a separate thread if the main thread is busy.
         """
+        if self.heartbeat is not None:
+            self.socketio.start_background_task(self.broadcast_link_quality)
         logger.info("[Socket.IO] A-Frame VRStreamingServer running on %s:%s", self.host, self.port)
         self.socketio.run(self.app, host=self.host, port=self.port, ssl_context=('localhost+2.pem', 'localhost+2-key.pem'))
 
@@ -1,6 +1,6 @@
 import cv2
 import logging
-from typing import Optional
+from typing import List, Optional
 
 def find_available_camera(max_checks: int = 10) -> Optional[int]:
     """
@@ -20,3 +20,25 @@ def find_available_camera(max_checks: int = 10) -> Optional[int]:
             return i
         cap.release()
     return None
+
+def find_available_cameras(count: int, max_checks: int = 10) -> List[int]:
+    """
+    Find the first `count` available camera indices, e.g. for a stereo pair.
+
+    Args:
+        count (int): Number of cameras wanted.
+        max_checks (int): Maximum camera indices to check.
+
+    Returns:
+        List[int]: The indices found, in order; fewer than `count` if not enough are available.
+    """
+    found = []
+    for i in range(max_checks):
+        cap = cv2.VideoCapture(i, cv2.CAP_V4L)
+        if cap.isOpened():
+            found.append(i)
+        cap.release()
+        if len(found) == count:
+            break
+    logging.info(f"Cameras found at indices {found}")
+    return found
@@ -0,0 +1,77 @@
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Optional
+
+# Same format as the doctor's capture.py, so robot captures can be read and
+# replayed with the doctor's tools: file header (magic + version), then per
+# record the arrival time (time.time_ns()), datagram length, channel and
+# network path (always 0 here), followed by the datagram bytes exactly as received.
+MAGIC = b'SRCAP'
+FILE_HEADER = struct.Struct('<5sBxx')
+RECORD = struct.Struct('<qHBB')
+VERSION = 2
+
+CHANNEL_VIDEO = 0
+CHANNEL_COMMAND = 1
+
+
+class CaptureWriter:
+    def __init__(self, path: str, chunk_size: int = 16 * 1024 * 1024) -> None:
+        """
+        Append datagrams with high-resolution arrival times to a memory-mapped file.
+
+        The file grows in chunks and is mapped into memory, so recording a
+        datagram costs two memory copies and no system call. close() trims the
+        file to its contents; an unclosed capture reads up to its last record.
+
+        Args:
+            path (str): Capture file to create (overwritten if it exists).
+            chunk_size (int): Growth step of the file in bytes.
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self._size = 0
+        self._map: Optional[mmap.mmap] = None
+        self._grow(FILE_HEADER.size)
+        FILE_HEADER.pack_into(self._map, 0, MAGIC, VERSION)
+        self._offset = FILE_HEADER.size
+        self.records = 0
+
+    def _grow(self, needed: int) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._size += max(self.chunk_size, needed)
+        os.ftruncate(self._fd, self._size)
+        self._map = mmap.mmap(self._fd, self._size)
+
+    def write(self, data: bytes, channel: int = CHANNEL_COMMAND, arrival_ns: Optional[int] = None) -> None:
+        """Record one datagram with its arrival time (default: now)."""
+        if arrival_ns is None:
+            arrival_ns = time.time_ns()
+        length = len(data)
+        with self._lock:
+            if self._map is None:
+                return
+            end = self._offset + RECORD.size + length
+            if end > self._size:
+                self._grow(end - self._size)
+            RECORD.pack_into(self._map, self._offset, arrival_ns, length, channel, 0)
+            self._map[self._offset + RECORD.size:end] = data
+            self._offset = end
+            self.records += 1
+
+    def close(self) -> None:
+        """Flush the capture and trim the file to the recorded data."""
+        with self._lock:
+            if self._map is None:
+                return
+            self._map.flush()
+            self._map.close()
+            self._map = None
+            os.ftruncate(self._fd, self._offset)
+            os.close(self._fd)
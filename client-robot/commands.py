@@ -1,10 +1,22 @@
 import serial
 import serial.tools.list_ports
 import time
+import logging
 import RPi.GPIO as GPIO
 
+class MotionHalted(Exception):
+    """Raised inside a motion sequence when motion is halted (e.g. by the watchdog)."""
+
+
+def pause(seconds, stop_event=None):
+    # Sleep between motion steps; returns early and raises once stop_event is set.
+    if stop_event is None:
+        time.sleep(seconds)
+    elif stop_event.wait(seconds):
+        raise MotionHalted()
+
 def messageToSequence(message):
-    print(f"Received message: {message}")
+    logging.debug("Received message: %s", message)
     if message == "r4":
         return "sequence1"
     elif message == "r5":
@@ -37,70 +49,75 @@ for pin in motor_pins:
     GPIO.setup(pin, GPIO.OUT)
     GPIO.output(pin, GPIO.LOW)
 
-def move_stepper(steps=4096, direction=False):
+def move_stepper(steps=4096, direction=False, stop_event=None):
     global motor_step_counter
-    # Moves the stepper in the desired direction for given steps
-    for _ in range(steps):
-        for pin in range(4):
-            GPIO.output(motor_pins[pin], step_sequence[motor_step_counter][pin])
-        motor_step_counter = (motor_step_counter - 1) % 8 if direction else (motor_step_counter + 1) % 8
-        time.sleep(step_sleep)
-    for pin in motor_pins:
-        GPIO.output(pin, GPIO.LOW)
+    # Moves the stepper in the desired direction for given steps; stops within
+    # one step (and de-energizes the coils) once stop_event is set.
+    try:
+        for _ in range(steps):
+            if stop_event is not None and stop_event.is_set():
+                raise MotionHalted()
+            for pin in range(4):
+                GPIO.output(motor_pins[pin], step_sequence[motor_step_counter][pin])
+            motor_step_counter = (motor_step_counter - 1) % 8 if direction else (motor_step_counter + 1) % 8
+            time.sleep(step_sleep)
+    finally:
+        for pin in motor_pins:
+            GPIO.output(pin, GPIO.LOW)
 
 def cleanup_gpio():
     for pin in motor_pins:
         GPIO.output(pin, GPIO.LOW)
     GPIO.cleanup()
 
-def run_sequence3(ser):
+def run_sequence3(ser, stop_event=None):
     # This replicates the servo + stepper logic from your snippet
     set_both_servos(ser, 70, 70)
-    time.sleep(0.2)
-    move_stepper(2048, False)
-    time.sleep(0.5)
+    pause(0.2, stop_event)
+    move_stepper(2048, False, stop_event)
+    pause(0.5, stop_event)
     set_both_servos(ser, 60, 90)
-    time.sleep(0.2)
+    pause(0.2, stop_event)
     set_both_servos(ser, 60, 100)
-    time.sleep(0.2)
+    pause(0.2, stop_event)
     set_both_servos(ser, 60, 80)
-    time.sleep(0.2)
+    pause(0.2, stop_event)
     set_both_servos(ser, 60, 90)
-    time.sleep(0.2)
+    pause(0.2, stop_event)
     set_both_servos(ser, 60, 100)
-    time.sleep(0.2)
+    pause(0.2, stop_event)
     set_both_servos(ser, 60, 80)
-    time.sleep(0.2)
+    pause(0.2, stop_event)
     set_both_servos(ser, 60, 90)
-    time.sleep(2)
+    pause(2, stop_event)
     set_both_servos(ser, 10, 0)
-    time.sleep(2)
+    pause(2, stop_event)
     set_both_servos(ser, 70, 115)
-    time.sleep(2)
+    pause(2, stop_event)
     set_both_servos(ser, 70, 70)
-    time.sleep(2)
-    move_stepper(2048, True)
-    time.sleep(0.5)
+    pause(2, stop_event)
+    move_stepper(2048, True, stop_event)
+    pause(0.5, stop_event)
     set_both_servos(ser, 60, 90)
-    time.sleep(0.2)
+    pause(0.2, stop_event)
     set_both_servos(ser, 60, 100)
-    time.sleep(0.2)
+    pause(0.2, stop_event)
     set_both_servos(ser, 60, 80)
-    time.sleep(0.2)
+    pause(0.2, stop_event)
     set_both_servos(ser, 60, 90)
-    time.sleep(0.2)
+    pause(0.2, stop_event)
     set_both_servos(ser, 60, 100)
-    time.sleep(0.2)
+    pause(0.2, stop_event)
     set_both_servos(ser, 60, 80)
-    time.sleep(0.2)
+    pause(0.2, stop_event)
     set_both_servos(ser, 60, 90)
-    time.sleep(2)
+    pause(2, stop_event)
     set_both_servos(ser, 10, 0)
-    time.sleep(1)
+    pause(1, stop_event)
     set_both_servos(ser, 70, 115)
-    time.sleep(1.5)
+    pause(1.5, stop_event)
     set_both_servos(ser, 70, 70)
-    time.sleep(2)
+    pause(2, stop_event)
 
 def find_arduino_serial_port(baud_rate=9600, timeout=2):
     ports = list(serial.tools.list_ports.comports())
@@ -114,4 +131,4 @@ def set_both_servos(ser, angle1, angle2):
     angle2 = max(0, min(180, angle2))
     command = f"S:{angle1},{angle2}\n"
     ser.write(command.encode('utf-8'))
-    print(f"Sent to Arduino: {command.strip()}")
\ No newline at end of file
+    logging.debug("Sent to Arduino: %s", command.strip())
\ No newline at end of file
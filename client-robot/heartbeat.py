@@ -0,0 +1,221 @@
+import logging
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Optional
+import metrics
+
+# Heartbeat datagrams (same layout in the doctor's heartbeat.py):
+#   ping: magic, type, seq, doctor send time (echoed back untouched)
+#   pong: magic, type, seq, echoed send time, ping loss and jitter seen here,
+#         watchdog state, watchdog trips and the last watchdog reaction time.
+MAGIC = b'HB'
+PING = struct.Struct('<2sBId')
+PONG = struct.Struct('<2sBIdffBIf')
+TYPE_PING = 1
+TYPE_PONG = 2
+
+WATCHDOG_DISARMED = 0  # No heartbeat received yet.
+WATCHDOG_OK = 1
+WATCHDOG_TRIPPED = 2
+
+
+class MotionWatchdog:
+    def __init__(
+        self,
+        halt: Callable[[], None],
+        resume: Callable[[], None],
+        timeout: float = 0.2,
+        max_reaction: float = 0.05,
+    ) -> None:
+        """
+        Halt motion when the doctor's heartbeat goes silent.
+
+        The watchdog arms on the first heartbeat, or on arm() (at startup, so
+        that a robot that never hears the doctor does not move unwatched). If
+        no heartbeat arrives for `timeout` seconds it calls halt(), and it
+        calls resume() on the next heartbeat after that. The watchdog thread sleeps until the exact
+        deadline, so detection itself adds well under a millisecond; the
+        reaction time (deadline to halt() returning, i.e. motion stopped) is
+        measured on every trip and a warning is logged above max_reaction.
+
+        Args:
+            halt (Callable[[], None]): Stops all motion; returns once it has stopped.
+            resume (Callable[[], None]): Allows motion again.
+            timeout (float): Silence window in seconds.
+            max_reaction (float): Reaction time budget in seconds.
+        """
+        self.halt = halt
+        self.resume = resume
+        self.timeout = timeout
+        self.max_reaction = max_reaction
+        self.state = WATCHDOG_DISARMED
+        self.last_heartbeat: Optional[float] = None
+        self.trips = 0
+        self.last_reaction: Optional[float] = None
+        self.worst_reaction: Optional[float] = None
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+
+        metrics.gauge("watchdog_state", "0 disarmed, 1 ok, 2 tripped.", fn=lambda: self.state)
+        metrics.counter("watchdog_trips_total", "Motion halts after heartbeat silence.", fn=lambda: self.trips)
+        metrics.gauge("watchdog_last_reaction_seconds", "Silence deadline to motion halted, last trip.",
+                      fn=lambda: self.last_reaction)
+        self._reaction = metrics.histogram(
+            "watchdog_reaction_seconds", "Silence deadline to motion halted.",
+            buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+    def arm(self) -> None:
+        """Start watching now, as if a heartbeat had just arrived."""
+        if self.state == WATCHDOG_DISARMED:
+            self.last_heartbeat = time.monotonic()
+            self.state = WATCHDOG_OK
+            logging.info("Motion watchdog armed at startup (silence window %.0f ms).", self.timeout * 1000)
+            self._wake.set()
+
+    def feed(self, now: float) -> None:
+        """Record a heartbeat received at `now` (time.monotonic())."""
+        self.last_heartbeat = now
+        if self.state == WATCHDOG_DISARMED:
+            self.state = WATCHDOG_OK
+            logging.info("Motion watchdog armed (silence window %.0f ms).", self.timeout * 1000)
+            self._wake.set()
+        elif self.state == WATCHDOG_TRIPPED:
+            self.state = WATCHDOG_OK
+            logging.info("Heartbeat back; motion allowed again.")
+            self.resume()
+            self._wake.set()
+
+    def run(self) -> None:
+        """Watch the heartbeat until stopped."""
+        while not self._stop_event.is_set():
+            if self.state != WATCHDOG_OK:
+                # Nothing to watch until the (next) heartbeat arrives.
+                self._wake.wait(0.1)
+                self._wake.clear()
+                continue
+            deadline = self.last_heartbeat + self.timeout
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                self._stop_event.wait(remaining)
+                continue
+            self._trip(deadline)
+
+    def _trip(self, deadline: float) -> None:
+        self.state = WATCHDOG_TRIPPED
+        self.trips += 1
+        logging.warning("No heartbeat for %.0f ms; halting motion.", self.timeout * 1000)
+        try:
+            self.halt()
+        except Exception as e:
+            logging.error("Motion halt failed: %s", e)
+        reaction = time.monotonic() - deadline
+        self.last_reaction = reaction
+        self.worst_reaction = max(reaction, self.worst_reaction or 0.0)
+        self._reaction.observe(reaction)
+        if reaction > self.max_reaction:
+            logging.warning("Watchdog reaction took %.1f ms (budget %.0f ms).",
+                            reaction * 1000, self.max_reaction * 1000)
+        else:
+            logging.info("Motion halted %.1f ms after the silence window expired.", reaction * 1000)
+
+    def stop(self) -> None:
+        """Signal the watchdog to stop."""
+        self._stop_event.set()
+        self._wake.set()
+
+
+class HeartbeatResponder:
+    def __init__(self, listen_ip: str, listen_port: int = 12346,
+                 watchdog: Optional[MotionWatchdog] = None) -> None:
+        """
+        Answer the doctor's heartbeat pings and feed the motion watchdog.
+
+        Every ping is echoed straight back as a pong, so the doctor can measure
+        the round trip; the pong also carries the loss and jitter of the pings
+        as seen here and the watchdog's state.
+
+        Args:
+            listen_ip (str): IP address to bind.
+            listen_port (int): Heartbeat port.
+            watchdog (Optional[MotionWatchdog]): Fed with every ping.
+        """
+        self.watchdog = watchdog
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((listen_ip, listen_port))
+        self._stop_event = threading.Event()
+        self.received = 0
+        self.lost = 0
+        self.loss = 0.0    # Recent fraction of pings lost (exponential average over ~128 pings).
+        self.jitter = 0.0  # Smoothed deviation of the ping inter-arrival time (RFC 3550 style).
+        self._last_seq: Optional[int] = None
+        self._last_arrival: Optional[float] = None
+        self._last_sent: Optional[float] = None
+        logging.info(f"Heartbeat responder bound to {listen_ip}:{listen_port}")
+
+        metrics.counter("heartbeat_pings_total", "Heartbeat pings received.", fn=lambda: self.received)
+        metrics.counter("heartbeat_pings_lost_total", "Heartbeat pings missing by sequence number.",
+                        fn=lambda: self.lost)
+        metrics.gauge("heartbeat_loss_ratio", "Recent fraction of heartbeat pings lost.",
+                      fn=lambda: self.loss)
+        metrics.gauge("heartbeat_jitter_seconds", "Jitter of the heartbeat ping arrivals.",
+                      fn=lambda: self.jitter)
+
+    def run(self) -> None:
+        """Answer pings until stopped."""
+        self.socket.settimeout(0.5)
+        buf = bytearray(64)
+        while not self._stop_event.is_set():
+            try:
+                nbytes, addr = self.socket.recvfrom_into(buf)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                if not self._stop_event.is_set():
+                    logging.error(f"Heartbeat receive error: {e}")
+                break
+            now = time.monotonic()
+            if nbytes != PING.size:
+                continue
+            magic, kind, seq, sent = PING.unpack_from(buf)
+            if magic != MAGIC or kind != TYPE_PING:
+                continue
+            if self.watchdog is not None:
+                self.watchdog.feed(now)
+            self._account(seq, sent, now)
+
+            watchdog = self.watchdog
+            try:
+                self.socket.sendto(PONG.pack(
+                    MAGIC, TYPE_PONG, seq, sent, self.loss, self.jitter,
+                    watchdog.state if watchdog else WATCHDOG_DISARMED,
+                    watchdog.trips if watchdog else 0,
+                    (watchdog.last_reaction or 0.0) if watchdog else 0.0), addr)
+            except OSError as e:
+                logging.debug("Heartbeat reply failed: %s", e)
+        self.socket.close()
+
+    def _account(self, seq: int, sent: float, now: float) -> None:
+        """Update loss and jitter statistics with a ping."""
+        if self._last_seq is not None:
+            gap = (seq - self._last_seq) & 0xFFFFFFFF
+            if gap == 0 or gap >= 0x80000000:
+                return  # Duplicate or reordered ping.
+            self.lost += gap - 1
+            for _ in range(min(gap - 1, 1024)):
+                self.loss += (1.0 - self.loss) / 128
+            self.loss -= self.loss / 128
+            # Transit time variation between consecutive pings, using the
+            # doctor's send times so that clock offsets cancel out.
+            if gap == 1:
+                variation = abs((now - self._last_arrival) - (sent - self._last_sent))
+                self.jitter += (variation - self.jitter) / 16
+        self._last_seq = seq
+        self._last_arrival = now
+        self._last_sent = sent
+        self.received += 1
+
+    def stop(self) -> None:
+        """Signal the responder to stop."""
+        self._stop_event.set()
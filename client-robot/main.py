@@ -3,6 +3,9 @@ import threading
 import time
 from video_sender import VideoSender
 from udp_receiver import UdpReceiver
+from supervisor import Supervisor
+from heartbeat import HeartbeatResponder, MotionWatchdog
+import metrics
 
 def setup_logging() -> None:
     """Configure logging format and level."""
@@ -17,18 +20,30 @@ def main() -> None:
     setup_logging()
 
     # Configuration
-    HOST = '10.8.0.2'  # Target host IP (e.g., Raspberry Pi)
+    HOST = '10.8.0.2'  # Target host IP (doctor), or '10.8.0.1' to stream via the hub relay
     PORT = 1189
+    # Send over several tunnels/interfaces at once: (doctor address, port, local source address).
+    # e.g. [('10.8.0.2', 1189, '10.8.0.3'), ('10.9.0.2', 1189, '10.9.0.3')]
+    VIDEO_PATHS = None
+    MULTIPATH_MODE = "duplicate"  # or "parity"
+    # 2 for a stereo camera pair: both views are sent side by side (left, right) in one stream.
+    CAMERA_VIEWS = 1
     listen_ip = "0.0.0.0"
     listen_port = 12345
+    heartbeat_port = 12346
+    watchdog_timeout = 0.2  # Halt motion after this many seconds without a heartbeat.
+    metrics_port = 9100  # /metrics (Prometheus) and /profile?seconds=N
+    capture_path = None  # e.g. "commands.cap" to capture received commands for replay
 
     try:
-        video_sender = VideoSender(HOST, PORT)
+        video_sender = VideoSender(HOST, PORT, paths=VIDEO_PATHS, multipath_mode=MULTIPATH_MODE,
+                                   views=CAMERA_VIEWS)
     except RuntimeError as e:
         logging.error(e)
         return
 
-    udp_receiver = UdpReceiver(listen_ip, listen_port)
+    udp_receiver = UdpReceiver(listen_ip, listen_port, capture_path=capture_path)
+    metrics.serve(listen_ip, metrics_port)
 
     video_thread = threading.Thread(target=video_sender.send_frames, daemon=True)
     video_thread.start()
@@ -38,11 +53,33 @@ def main() -> None:
     udp_thread.start()
     logging.info("UdpReceiver thread started.")
 
+    # The doctor pings at 50 Hz; motion stops when the pings stop.
+    watchdog = MotionWatchdog(udp_receiver.halt_motion, udp_receiver.resume_motion,
+                              timeout=watchdog_timeout)
+    heartbeat = HeartbeatResponder(listen_ip, heartbeat_port, watchdog)
+    # Armed now: until the doctor's heartbeat arrives, motion stays halted.
+    watchdog.arm()
+    threading.Thread(target=watchdog.run, daemon=True).start()
+    threading.Thread(target=heartbeat.run, daemon=True).start()
+    logging.info("Heartbeat responder and motion watchdog started.")
+
+    # Restart failed components in place instead of re-exec'ing the whole process.
+    supervisor = Supervisor()
+    supervisor.register("camera", video_sender.camera_healthy, video_sender.restart_camera)
+    supervisor.register("encoder", video_sender.encoder_healthy, video_sender.restart_encoder)
+    supervisor.register("serial", udp_receiver.serial_healthy, udp_receiver.reconnect_arduino)
+    supervisor_thread = threading.Thread(target=supervisor.run, daemon=True)
+    supervisor_thread.start()
+    logging.info("Supervisor thread started.")
+
     try:
         while True:
             time.sleep(1)  # Keep the main thread alive.
     except KeyboardInterrupt:
         logging.info("KeyboardInterrupt received, stopping services...")
+        supervisor.stop()
+        watchdog.stop()
+        heartbeat.stop()
         video_sender.stop()
         udp_receiver.stop()
 
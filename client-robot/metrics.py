@@ -0,0 +1,242 @@
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+import collections
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Sequence, Tuple
+from urllib.parse import urlparse, parse_qs
+
+# Latency buckets in seconds, from sub-millisecond to several seconds.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labels: Optional[Dict[str, str]]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in sorted(labels.items())) + '}'
+
+
+class Counter:
+    __slots__ = ('labels', 'value', 'fn')
+
+    def __init__(self, labels: str, fn: Optional[Callable[[], Optional[float]]] = None) -> None:
+        """
+        A monotonically increasing value. With fn, the value is read at scrape time
+        from a counter the component already keeps.
+        """
+        self.labels = labels
+        self.value = 0
+        self.fn = fn
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def render(self, name: str):
+        value = self.value
+        if self.fn is not None:
+            try:
+                value = self.fn()
+            except Exception as e:
+                logging.debug("Counter %s failed: %s", name, e)
+                return
+            if value is None:
+                return
+        yield f"{name}{self.labels} {value}"
+
+
+class Gauge:
+    __slots__ = ('labels', 'value', 'fn')
+
+    def __init__(self, labels: str, fn: Optional[Callable[[], Optional[float]]] = None) -> None:
+        """
+        A value that can go up and down. With fn, the value is computed at scrape
+        time, so the hot path pays nothing for it.
+        """
+        self.labels = labels
+        self.value = 0
+        self.fn = fn
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def render(self, name: str):
+        value = self.value
+        if self.fn is not None:
+            try:
+                value = self.fn()
+            except Exception as e:
+                logging.debug("Gauge %s failed: %s", name, e)
+                return
+            if value is None:
+                return
+        yield f"{name}{self.labels} {value}"
+
+
+class Histogram:
+    __slots__ = ('labels', 'buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, labels: str, buckets: Sequence[float]) -> None:
+        """Distribution of observed values in fixed buckets (one bisect per observation)."""
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str):
+        base = self.labels[1:-1] + ',' if self.labels else ''
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{base}le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{base}le="+Inf"}} {self.count}'
+        yield f"{name}_sum{self.labels} {self.sum}"
+        yield f"{name}_count{self.labels} {self.count}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        """
+        Process-wide collection of metrics, rendered in the Prometheus text format.
+
+        Metrics are created once (get-or-create by name and labels) and then
+        updated without locks: counters and histograms may lose an increment
+        under heavy contention, which is acceptable for monitoring.
+        """
+        self._families: Dict[str, Tuple[str, str, Dict[str, object]]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind: str, name: str, help_text: str, labels, factory):
+        key = _format_labels(labels)
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = (kind, help_text, {})
+                self._families[name] = family
+            elif family[0] != kind:
+                raise ValueError(f"Metric {name} already registered as a {family[0]}.")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = factory(key)
+                family[2][key] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None,
+                fn: Optional[Callable[[], Optional[float]]] = None) -> Counter:
+        counter = self._get('counter', name, help_text, labels, lambda key: Counter(key, fn))
+        if fn is not None:
+            counter.fn = fn  # A re-created component takes over the callback.
+        return counter
+
+    def gauge(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None,
+              fn: Optional[Callable[[], Optional[float]]] = None) -> Gauge:
+        gauge = self._get('gauge', name, help_text, labels, lambda key: Gauge(key, fn))
+        if fn is not None:
+            gauge.fn = fn  # A re-created component takes over the callback.
+        return gauge
+
+    def histogram(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None,
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get('histogram', name, help_text, labels, lambda key: Histogram(key, buckets))
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            families = list(self._families.items())
+        for name, (kind, help_text, metrics) in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in list(metrics.values()):
+                lines.extend(metric.render(name))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+_profile_lock = threading.Lock()
+
+
+def sample_profile(duration: float = 10.0, interval: float = 0.005) -> str:
+    """
+    Sample the stacks of all threads for `duration` seconds.
+
+    Returns the profile in the collapsed-stack format ("thread;outer;...;inner count"
+    per line), which flamegraph.pl and speedscope render as a flame graph.
+    Only one profile runs at a time.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already being recorded.")
+    try:
+        samples: collections.Counter = collections.Counter()
+        me = threading.get_ident()
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                samples[';'.join(reversed(stack))] += 1
+            time.sleep(interval)
+        return '\n'.join(f"{stack} {count}" for stack, count in samples.most_common()) + '\n'
+    finally:
+        _profile_lock.release()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path == '/metrics':
+            self._reply(200, REGISTRY.render(), 'text/plain; version=0.0.4')
+        elif url.path == '/profile':
+            try:
+                seconds = min(float(parse_qs(url.query).get('seconds', ['10'])[0]), 120.0)
+                profile = sample_profile(seconds)
+            except (ValueError, RuntimeError) as e:
+                self._reply(409, f"{e}\n", 'text/plain')
+                return
+            self._reply(200, profile, 'text/plain',
+                        {'Content-Disposition': f'attachment; filename="robot-{int(time.time())}.folded"'})
+        else:
+            self._reply(404, "Not found\n", 'text/plain')
+
+    def _reply(self, status: int, body: str, content_type: str, headers: Optional[dict] = None) -> None:
+        data = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug("Metrics HTTP: " + format, *args)
+
+
+def serve(host: str = '0.0.0.0', port: int = 9100) -> ThreadingHTTPServer:
+    """
+    Serve /metrics (Prometheus format) and /profile?seconds=N (collapsed stacks)
+    from a background thread.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Metrics endpoint listening on {host}:{port}")
+    return server
@@ -0,0 +1,267 @@
+import collections
+import logging
+import threading
+import time
+from typing import Callable, Deque, List, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+import metrics
+
+
+class CameraReader:
+    def __init__(
+        self,
+        view: int,
+        camera_index: int,
+        width: int,
+        height: int,
+        on_frame: Callable[[], None],
+        history: int = 4,
+    ) -> None:
+        """
+        Capture one camera on its own thread, stamping every frame.
+
+        Each frame is stamped right after grab() returns, before it is decoded
+        with retrieve(), so the stamp is as close to the exposure as OpenCV
+        allows. OpenCV releases the GIL while grabbing and decoding, so the
+        readers of several cameras run on separate cores.
+
+        Args:
+            view (int): Position of this camera in the packed frame (0 = left).
+            camera_index (int): OpenCV camera index.
+            width (int): Requested frame width.
+            height (int): Requested frame height.
+            on_frame (Callable[[], None]): Called after each new frame is stored.
+            history (int): Number of recent frames kept for pairing.
+        """
+        self.view = view
+        self.camera_index = camera_index
+        self.on_frame = on_frame
+        self.capture = cv2.VideoCapture(camera_index)
+        self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        # (capture time, frame) pairs, oldest first; guarded by the owner's condition.
+        self.frames: Deque[Tuple[float, np.ndarray]] = collections.deque(maxlen=history)
+        self.fps = 0.0
+        self.failures = 0
+        self.last_frame_time: Optional[float] = None  # Capture time of the newest frame.
+        self._last_stamp: Optional[float] = None
+        self._stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+        labels = {"camera": str(view)}
+        self._frames = metrics.counter("stereo_camera_frames_total", "Frames captured per camera.", labels)
+        self._failures = metrics.counter("stereo_camera_failures_total", "Failed reads per camera.", labels)
+        metrics.gauge("stereo_camera_fps", "Smoothed capture rate per camera.", labels, fn=lambda: self.fps)
+
+    def start(self, lock: threading.Condition) -> None:
+        """Start the capture thread; frames are stored under `lock`."""
+        self.thread = threading.Thread(target=self._run, args=(lock,), daemon=True)
+        self.thread.start()
+
+    def _fail(self, lock: threading.Condition) -> None:
+        # Frames from before a failure must not be paired with newer ones.
+        self._failures.inc()
+        self.failures += 1
+        with lock:
+            self.frames.clear()
+
+    def _run(self, lock: threading.Condition) -> None:
+        while not self._stop_event.is_set():
+            if not self.capture.grab():
+                self._fail(lock)
+                time.sleep(0.05)
+                continue
+            stamp = time.monotonic()
+            ret, frame = self.capture.retrieve()
+            if not ret:
+                self._fail(lock)
+                continue
+            if self._last_stamp is not None:
+                interval = stamp - self._last_stamp
+                if interval > 0:
+                    self.fps += (1.0 / interval - self.fps) / 16
+            self._last_stamp = stamp
+            self.last_frame_time = stamp
+            self._frames.inc()
+            with lock:
+                self.frames.append((stamp, frame))
+            self.on_frame()
+
+    def stop(self) -> None:
+        """Stop the capture thread and release the camera."""
+        self._stop_event.set()
+        if self.thread is not None and self.thread.is_alive() and threading.current_thread() != self.thread:
+            self.thread.join(timeout=1)
+        if self.capture.isOpened():
+            self.capture.release()
+
+
+class StereoCapture:
+    def __init__(
+        self,
+        camera_indices: Sequence[int],
+        width: int = 640,
+        height: int = 480,
+        tolerance: float = 0.010,
+        timeout: float = 0.5,
+        max_skew: float = 0.040,
+    ) -> None:
+        """
+        Capture several cameras and pack time-aligned frames side by side.
+
+        A drop-in replacement for cv2.VideoCapture in VideoSender: read()
+        returns one frame of width * len(camera_indices) pixels, with camera 0
+        on the left. Every camera is read by its own CameraReader thread.
+        read() takes the newest frame of camera 0 and, from each other camera,
+        the frame captured closest to it. If another camera is behind, read()
+        waits up to `tolerance` for a frame closer than that. Free-running
+        cameras can drift up to half a frame interval apart, so a set that
+        still misses the tolerance is sent with the closest frames rather than
+        dropped; it is counted as unpaired, and its skew is recorded either way.
+        A set whose closest frames are more than `max_skew` apart is dropped
+        as stale instead, so a camera that stopped never freezes its view.
+
+        Args:
+            camera_indices (Sequence[int]): OpenCV camera indices, left to right.
+            width (int): Width of each view.
+            height (int): Height of each view.
+            tolerance (float): Capture time difference within a set that counts as paired,
+                in seconds; also the longest read() waits for a closer frame.
+            timeout (float): Seconds read() waits for a pair before reporting a failure.
+            max_skew (float): Largest capture time difference within a set that is sent
+                at all (about one frame interval).
+        """
+        self.width = width
+        self.height = height
+        self.tolerance = tolerance
+        self.timeout = timeout
+        self.max_skew = max_skew
+        self._condition = threading.Condition()
+        self._last_stamp = 0.0  # Capture time of the last reference frame returned.
+        self.pairs = 0     # Sets packed.
+        self.unpaired = 0  # Sets packed with a spread above the tolerance.
+        self.stale = 0     # Sets dropped with a spread above max_skew.
+        self.skew: Optional[float] = None  # Capture time spread of the last pair.
+
+        self.readers: List[CameraReader] = [
+            CameraReader(view, index, width, height, self._notify)
+            for view, index in enumerate(camera_indices)
+        ]
+
+        self._pairs = metrics.counter("stereo_pairs_total", "Frame sets packed.")
+        self._unpaired = metrics.counter(
+            "stereo_unpaired_total", "Frame sets packed with a capture time spread above the tolerance.")
+        self._stale = metrics.counter(
+            "stereo_stale_total", "Frame sets dropped with a capture time spread above max_skew.")
+        self._skew = metrics.histogram(
+            "stereo_pair_skew_seconds", "Capture time spread within a packed frame set.",
+            buckets=(0.0005, 0.001, 0.002, 0.004, 0.008, 0.016, 0.033, 0.066))
+        metrics.gauge("stereo_last_pair_skew_seconds", "Capture time spread of the last packed set.",
+                      fn=lambda: self.skew)
+
+        if self.isOpened():
+            for reader in self.readers:
+                reader.start(self._condition)
+        logging.info("Stereo capture on cameras %s (tolerance %.1f ms).",
+                     list(camera_indices), tolerance * 1000)
+
+    def _notify(self) -> None:
+        with self._condition:
+            self._condition.notify_all()
+
+    def isOpened(self) -> bool:
+        return all(reader.capture.isOpened() for reader in self.readers)
+
+    def _match(self, now: float) -> Tuple[Optional[Tuple[List[np.ndarray], float, bool]], Optional[float]]:
+        """
+        Pick the views for the newest reference frame; call with the condition held.
+
+        Returns ((views left to right, capture time spread, within tolerance),
+        None) when a set is ready, or (None, time to retry at or None) while
+        waiting for frames. A reference frame without partners within
+        max_skew is dropped.
+        """
+        reference, others = self.readers[0], self.readers[1:]
+        if not reference.frames:
+            return None, None
+        stamp, frame = reference.frames[-1]
+        if stamp <= self._last_stamp:
+            return None, None
+        views = [frame]
+        skew = 0.0
+        for reader in others:
+            if not reader.frames:
+                return None, None
+            other_stamp, other = min(reader.frames, key=lambda entry: abs(entry[0] - stamp))
+            if (abs(other_stamp - stamp) > self.tolerance and reader.frames[-1][0] < stamp
+                    and now < stamp + self.tolerance):
+                # A frame within tolerance may still arrive; after that the
+                # closest one is used anyway rather than dropping the set.
+                return None, stamp + self.tolerance
+            if abs(other_stamp - stamp) > self.max_skew:
+                self._last_stamp = stamp
+                self.stale += 1
+                self._stale.inc()
+                if self.stale == 1 or self.stale % 300 == 0:
+                    logging.warning("Camera %d has no frame within %.1f ms of camera 0; dropping the "
+                                    "set (%d such sets so far).", reader.view, self.max_skew * 1000,
+                                    self.stale)
+                return None, None
+            views.append(other)
+            skew = max(skew, abs(other_stamp - stamp))
+        self._last_stamp = stamp
+        return (views, skew, skew <= self.tolerance), None
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        """Wait for the next set of frames and return it packed side by side."""
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                match, retry_at = self._match(now)
+                if match is not None:
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False, None
+                if retry_at is not None:
+                    remaining = min(remaining, max(0.0, retry_at - now))
+                self._condition.wait(remaining)
+        views, skew, paired = match
+
+        self.pairs += 1
+        self.skew = skew
+        self._pairs.inc()
+        self._skew.observe(skew)
+        if not paired:
+            self.unpaired += 1
+            self._unpaired.inc()
+            if self.unpaired == 1 or self.unpaired % 300 == 0:
+                logging.warning("Cameras are %.1f ms apart (tolerance %.1f ms); sending the closest "
+                                "frames (%d such sets so far).", skew * 1000, self.tolerance * 1000,
+                                self.unpaired)
+
+        # Packing copies run outside the lock, so the readers keep capturing.
+        packed = np.empty((self.height, self.width * len(views), 3), dtype=np.uint8)
+        for position, view in enumerate(views):
+            if view.shape[0] != self.height or view.shape[1] != self.width:
+                view = cv2.resize(view, (self.width, self.height))
+            packed[:, position * self.width:(position + 1) * self.width] = view
+        return True, packed
+
+    def stale_views(self, timeout: float) -> List[int]:
+        """Views whose camera has delivered no frame for `timeout` seconds, or none yet."""
+        now = time.monotonic()
+        return [reader.view for reader in self.readers
+                if reader.last_frame_time is None or now - reader.last_frame_time >= timeout]
+
+    def camera_fps(self) -> List[float]:
+        """Smoothed capture rate of each camera, left to right."""
+        return [reader.fps for reader in self.readers]
+
+    def release(self) -> None:
+        for reader in self.readers:
+            reader.stop()
+        with self._condition:
+            self._condition.notify_all()
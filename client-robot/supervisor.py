@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+import metrics
+
+
+class Component:
+    def __init__(
+        self,
+        name: str,
+        health_check: Callable[[], Optional[bool]],
+        restart: Callable[[], None],
+        initial_backoff: float,
+        max_backoff: float,
+    ) -> None:
+        """
+        A supervised component and its recovery bookkeeping.
+
+        Args:
+            name (str): Name used in logs and stats.
+            health_check (Callable[[], Optional[bool]]): Returns True while the component
+                works, False once it has failed, and None while it is starting and has
+                not yet shown that it works (neither failed nor recovered).
+            restart (Callable[[], None]): Restarts the component in place; may raise.
+            initial_backoff (float): Delay in seconds before the second restart attempt.
+            max_backoff (float): Upper bound for the exponential backoff delay.
+        """
+        self.name = name
+        self.health_check = health_check
+        self.restart = restart
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.backoff = initial_backoff
+        self.failed_since: Optional[float] = None
+        self.next_attempt = 0.0
+        self.attempts = 0
+        self.restarts = 0
+        self.recoveries = 0
+        self.last_recovery_time: Optional[float] = None
+
+        labels = {"component": name}
+        metrics.gauge("supervisor_component_healthy", "1 while the component passes its health check.",
+                      labels, fn=lambda: 0 if self.failed_since is not None else 1)
+        metrics.counter("supervisor_restarts_total", "In-place restarts performed.",
+                        labels, fn=lambda: self.restarts)
+        metrics.gauge("supervisor_last_recovery_seconds", "Duration of the most recent recovery.",
+                      labels, fn=lambda: self.last_recovery_time)
+        self.recovery_seconds = metrics.histogram(
+            "supervisor_recovery_seconds", "Time from failure detection to a passing health check.",
+            labels, buckets=(0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0))
+
+
+class Supervisor:
+    def __init__(
+        self,
+        check_interval: float = 0.25,
+        initial_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ) -> None:
+        """
+        Monitor components with health checks and restart failed ones in place.
+
+        Only the failed component is restarted; everything else (in particular
+        the UDP command listener) keeps running. Restart attempts back off
+        exponentially while a component stays unhealthy, and the time from
+        failure detection to a passing health check is recorded per component.
+        A restarted component that reports it is still starting is given time
+        without counting as recovered, so only real progress resets the backoff.
+
+        Args:
+            check_interval (float): Seconds between health check rounds.
+            initial_backoff (float): Delay before retrying a restart that did not help.
+            max_backoff (float): Upper bound for the backoff delay.
+        """
+        self.check_interval = check_interval
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.components: Dict[str, Component] = {}
+        self._stop_event = threading.Event()
+
+    def register(self, name: str, health_check: Callable[[], Optional[bool]],
+                 restart: Callable[[], None]) -> None:
+        """Add a component to supervise."""
+        self.components[name] = Component(name, health_check, restart,
+                                          self.initial_backoff, self.max_backoff)
+
+    def run(self) -> None:
+        """Check all components until stopped."""
+        logging.info("Supervisor monitoring: %s", ", ".join(self.components))
+        while not self._stop_event.is_set():
+            for component in self.components.values():
+                self._check(component)
+            self._stop_event.wait(self.check_interval)
+
+    def _check(self, component: Component) -> None:
+        """Run one health check and restart or record recovery as needed."""
+        now = time.monotonic()
+        try:
+            healthy = component.health_check()
+        except Exception as e:
+            logging.error("Health check for %s raised: %s", component.name, e)
+            healthy = False
+
+        if healthy is None:
+            # Starting: no evidence either way. A restarted component stays
+            # failed, without another attempt, until it proves it works or fails.
+            return
+        if healthy:
+            if component.failed_since is not None:
+                component.last_recovery_time = now - component.failed_since
+                component.recoveries += 1
+                component.recovery_seconds.observe(component.last_recovery_time)
+                logging.info("%s recovered in %.2f s after %d restart attempt(s).",
+                             component.name, component.last_recovery_time, component.attempts)
+                component.failed_since = None
+                component.attempts = 0
+                component.backoff = component.initial_backoff
+            return
+
+        if component.failed_since is None:
+            component.failed_since = now
+            component.next_attempt = now
+            logging.warning("%s is unhealthy; restarting it.", component.name)
+        if now < component.next_attempt:
+            return
+
+        component.attempts += 1
+        try:
+            component.restart()
+            component.restarts += 1
+        except Exception as e:
+            logging.error("Restart of %s failed (attempt %d): %s",
+                          component.name, component.attempts, e)
+        # Give the restarted component one backoff period to become healthy
+        # before trying again, doubling the wait on every failed attempt.
+        component.next_attempt = time.monotonic() + component.backoff
+        component.backoff = min(component.backoff * 2, component.max_backoff)
+
+    def stats(self) -> Dict[str, dict]:
+        """Per-component recovery statistics."""
+        return {
+            name: {
+                "healthy": component.failed_since is None,
+                "restarts": component.restarts,
+                "recoveries": component.recoveries,
+                "last_recovery_time": component.last_recovery_time,
+            }
+            for name, component in self.components.items()
+        }
+
+    def stop(self) -> None:
+        """Signal the supervisor to stop."""
+        self._stop_event.set()
@@ -1,41 +1,103 @@
+import os
+import contextlib
 import socket
 import logging
 import threading
 import time
+from typing import Iterator, Optional
 import commands  # Import functions from command.py
+import metrics
+from capture import CaptureWriter
 
 class UdpReceiver:
-    def __init__(self, listen_ip: str, listen_port: int) -> None:
+    def __init__(self, listen_ip: str, listen_port: int, capture_path: Optional[str] = None) -> None:
         """
         Initialize the UDP receiver and establish a persistent connection to the Arduino.
         
         Args:
             listen_ip (str): IP address to bind the listener.
             listen_port (int): Port number for incoming messages.
+            capture_path (Optional[str]): File to capture every received command datagram
+                to, with its arrival time, or None.
         """
         self.listen_ip = listen_ip
         self.listen_port = listen_port
+        self.capture: Optional[CaptureWriter] = None
+        if capture_path:
+            self.capture = CaptureWriter(capture_path)
+            logging.info(f"Capturing command datagrams to {capture_path}")
         self._stop_event = threading.Event()
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.socket.bind((self.listen_ip, self.listen_port))
         logging.info(f"UDP receiver bound to {self.listen_ip}:{self.listen_port}")
 
+        self._messages = metrics.counter("udp_receiver_messages_total", "Command datagrams received.")
+        self._decode_errors = metrics.counter("udp_receiver_decode_errors_total",
+                                              "Command datagrams that were not valid UTF-8.")
+        self._dispatch_delay = metrics.histogram(
+            "udp_receiver_dispatch_seconds", "Delay from receiving a command to starting to process it.")
+        self._sequences = {
+            result: metrics.counter("udp_receiver_sequences_total", "Servo sequences by outcome.",
+                                    {"result": result})
+            for result in ("completed", "busy", "failed", "no_serial", "ignored", "halted")
+        }
+
+        # Lock to prevent concurrent servo sequence executions
+        self.command_lock = threading.Lock()
+
+        # Set by halt_motion(): running sequences stop at their next step and
+        # new ones are refused until resume_motion().
+        self.halt_event = threading.Event()
+        self._motions = 0
+        self._motions_done = threading.Condition()
+
         # Establish a persistent connection to Arduino
+        self.arduino_ser = None
+        self._serial_failed = False
+        self._connect_arduino()
+
+    def _connect_arduino(self) -> bool:
+        """Find the Arduino and open a serial connection to it."""
         arduino_port = commands.find_arduino_serial_port()
         if arduino_port:
             try:
                 self.arduino_ser = commands.serial.Serial(arduino_port, 9600, timeout=1)
                 self.arduino_ser.reset_input_buffer()
+                self._serial_failed = False
                 logging.info(f"Arduino connected on {arduino_port}")
+                return True
             except Exception as e:
                 logging.error(f"Failed to connect to Arduino on {arduino_port}: {e}")
                 self.arduino_ser = None
         else:
             logging.error("Arduino not found. Servo commands will not be executed.")
             self.arduino_ser = None
+        return False
 
-        # Lock to prevent concurrent servo sequence executions
-        self.command_lock = threading.Lock()
+    def serial_healthy(self) -> bool:
+        """The serial link is healthy while the port is open, present, and writes succeed."""
+        ser = self.arduino_ser
+        return (ser is not None and ser.is_open and not self._serial_failed
+                and os.path.exists(ser.port))
+
+    def reconnect_arduino(self) -> None:
+        """
+        Reopen the Arduino serial link in place. UDP commands keep being received
+        meanwhile; sequences that arrive before the link is back are rejected.
+        """
+        if not self.command_lock.acquire(timeout=5):
+            raise RuntimeError("Servo sequence still running; serial reconnect postponed.")
+        try:
+            if self.arduino_ser is not None:
+                try:
+                    self.arduino_ser.close()
+                except Exception as e:
+                    logging.debug(f"Error closing stale serial port: {e}")
+                self.arduino_ser = None
+            if not self._connect_arduino():
+                raise RuntimeError("Arduino serial link unavailable.")
+        finally:
+            self.command_lock.release()
 
     def run(self) -> None:
         """Listen for UDP messages until stopped."""
@@ -47,28 +109,41 @@ class UdpReceiver:
                     data, addr = self.socket.recvfrom(1024)
                 except socket.timeout:
                     continue
+                received = time.perf_counter()
+                if self.capture is not None:
+                    self.capture.write(data)
+                self._messages.inc()
                 try:
                     message = data.decode().strip()
-                    logging.info(f"Received message: {message} from {addr}")
+                    logging.debug("Received message: %s from %s", message, addr)
                     # Process the message asynchronously to keep the listener responsive.
-                    threading.Thread(target=self.process_message, args=(message,), daemon=True).start()
+                    threading.Thread(target=self.process_message, args=(message, received), daemon=True).start()
                 except UnicodeDecodeError as decode_error:
+                    self._decode_errors.inc()
                     logging.error(f"Failed to decode message from {addr}: {decode_error}")
         except Exception as e:
             logging.error(f"Error in UDP receiver: {e}")
         finally:
             self.cleanup()
 
-    def process_message(self, message: str) -> None:
+    def process_message(self, message: str, received: Optional[float] = None) -> None:
         """
         Process the received message by mapping it to a servo command sequence.
         
         Args:
             message (str): The received command message.
+            received (Optional[float]): perf_counter() timestamp of reception, for metrics.
         """
+        if received is not None:
+            self._dispatch_delay.observe(time.perf_counter() - received)
         sequence = commands.messageToSequence(message)
         if sequence == "stop":
-            logging.info("Received 'stop' or unrecognized command; no action taken.")
+            logging.debug("Received 'stop' or unrecognized command; no action taken.")
+            self._sequences["ignored"].inc()
+            return
+        if self.halt_event.is_set():
+            logging.warning("Motion is halted (link to the doctor lost); ignoring %s.", sequence)
+            self._sequences["halted"].inc()
             return
 
         # Define servo sequences based on the command.
@@ -83,38 +158,85 @@ class UdpReceiver:
             sleep_times = [2, 0.2, 0.2, 0.2, 2, 2]
 
         elif sequence == "sequence3":
-            logging.info("Executing sequence3...")
-            commands.run_sequence3(self.arduino_ser)
+            # Servo and stepper steps interleave; they live in commands.run_sequence3.
+            servo1 = servo2 = sleep_times = None
+
         else:
             logging.info("Unknown sequence; no action taken.")
+            self._sequences["ignored"].inc()
             return
 
         # Execute the servo sequence if an Arduino connection is available.
         if self.arduino_ser is None:
             logging.error("No Arduino connection available; cannot execute servo sequence.")
+            self._sequences["no_serial"].inc()
             return
 
         # Use a lock to ensure only one servo sequence runs at a time.
         if not self.command_lock.acquire(blocking=False):
             logging.warning("Another servo command sequence is currently running; ignoring new command.")
+            self._sequences["busy"].inc()
             return
 
         try:
             logging.info(f"Executing {sequence}...")
-            for i in range(len(servo1)):
-                commands.set_both_servos(self.arduino_ser, servo1[i], servo2[i])
-                time.sleep(sleep_times[i])
+            with self._motion():
+                if sequence == "sequence3":
+                    commands.run_sequence3(self.arduino_ser, self.halt_event)
+                else:
+                    for i in range(len(servo1)):
+                        commands.set_both_servos(self.arduino_ser, servo1[i], servo2[i])
+                        commands.pause(sleep_times[i], self.halt_event)
             logging.info(f"{sequence} execution completed.")
+            self._sequences["completed"].inc()
+        except commands.MotionHalted:
+            logging.warning(f"{sequence} halted.")
+            self._sequences["halted"].inc()
         except Exception as e:
+            self._sequences["failed"].inc()
             logging.error(f"Error executing {sequence}: {e}")
+            if isinstance(e, (OSError, commands.serial.SerialException)):
+                self._serial_failed = True  # Let the supervisor reopen the link.
         finally:
             self.command_lock.release()
 
+    @contextlib.contextmanager
+    def _motion(self) -> Iterator[None]:
+        """Track a running motion sequence so that halt_motion() can wait for it to stop."""
+        with self._motions_done:
+            self._motions += 1
+        try:
+            yield
+        finally:
+            with self._motions_done:
+                self._motions -= 1
+                self._motions_done.notify_all()
+
+    def halt_motion(self, timeout: float = 1.0) -> bool:
+        """
+        Stop running servo/stepper sequences at their next step and refuse new
+        ones until resume_motion(). Returns once motion has stopped (True) or
+        after `timeout` seconds (False).
+        """
+        self.halt_event.set()
+        with self._motions_done:
+            stopped = self._motions_done.wait_for(lambda: self._motions == 0, timeout)
+        if not stopped:
+            logging.error("Motion did not stop within %.1f s of the halt.", timeout)
+        return stopped
+
+    def resume_motion(self) -> None:
+        """Accept motion commands again after a halt."""
+        self.halt_event.clear()
+
     def stop(self) -> None:
         """Signal the receiver to stop listening."""
         self._stop_event.set()
 
     def cleanup(self) -> None:
-        """Close the UDP socket."""
+        """Close the UDP socket and the capture file."""
         self.socket.close()
         logging.info("UDP receiver socket closed.")
+        if self.capture is not None:
+            self.capture.close()
+            logging.info(f"Captured {self.capture.records} command datagrams to {self.capture.path}")
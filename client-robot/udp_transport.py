@@ -0,0 +1,341 @@
+import os
+import random
+import socket
+import struct
+import threading
+import time
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+# Datagram header: timestamp (double), stream session ID, sequence number,
+# flags and chunk size. The session ID changes whenever the encoder restarts,
+# so the receiver can tell a new stream from packet loss.
+HEADER = struct.Struct('<dIIHH')
+FLAG_KEYFRAME = 0x1  # Chunk contains the start of a keyframe (random access point).
+FLAG_PARITY = 0x2    # XOR parity over a group of chunks; seq is the group's first seq.
+
+# Prefix of a parity payload: group size, XOR of the chunk sizes and XOR of
+# their flags, followed by the XOR of the (zero-padded) chunk payloads.
+PARITY_HEADER = struct.Struct('<HHH')
+
+# MPEG-TS packets are 188 bytes; 7 of them (1316 bytes) is the conventional
+# UDP payload and fits the WireGuard MTU without IP fragmentation.
+TS_PACKET_SIZE = 188
+DEFAULT_CHUNK_SIZE = 7 * TS_PACKET_SIZE
+
+
+def contains_random_access(payload) -> bool:
+    """
+    Check whether a buffer of MPEG-TS packets contains a random access point.
+
+    FFmpeg's MPEG-TS muxer sets the adaptation field's random_access_indicator
+    on the first packet of every video keyframe.
+    """
+    for offset in range(0, len(payload) - TS_PACKET_SIZE + 1, TS_PACKET_SIZE):
+        if (payload[offset + 3] & 0x20 and payload[offset + 4]
+                and payload[offset + 5] & 0x40):
+            return True
+    return False
+
+
+def set_socket_buffer(sock: socket.socket, option: int, size: Optional[int]) -> Optional[int]:
+    """
+    Request a kernel socket buffer size and return the size actually granted.
+
+    Args:
+        sock (socket.socket): The socket to configure.
+        option (int): socket.SO_SNDBUF or socket.SO_RCVBUF.
+        size (Optional[int]): Requested size in bytes, or None to keep the default.
+
+    Returns:
+        Optional[int]: The effective buffer size reported by the kernel.
+    """
+    if size:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, option, size)
+        except OSError as e:
+            logging.warning("Failed to set socket buffer to %d bytes: %s", size, e)
+    try:
+        granted = sock.getsockopt(socket.SOL_SOCKET, option)
+    except OSError:
+        return None
+    # Linux doubles the requested value for bookkeeping and caps it at
+    # net.core.[rw]mem_max, so report when the request was clamped.
+    if size and granted < size:
+        logging.warning("Kernel granted %d bytes of socket buffer (requested %d); "
+                        "raise net.core.wmem_max/rmem_max to allow more.", granted, size)
+    return granted
+
+
+def read_socket_drops(sock: socket.socket) -> Optional[int]:
+    """
+    Read the kernel drop counter for a UDP socket from /proc/net/udp.
+
+    The socket is matched by inode, so this works for bound and unbound sockets.
+
+    Returns:
+        Optional[int]: Number of datagrams dropped by the kernel, or None if unavailable.
+    """
+    try:
+        inode = os.fstat(sock.fileno()).st_ino
+    except OSError:
+        return None
+    for path in ('/proc/net/udp', '/proc/net/udp6'):
+        try:
+            with open(path) as f:
+                next(f, None)  # Skip the column header.
+                for line in f:
+                    fields = line.split()
+                    if len(fields) >= 13 and int(fields[9]) == inode:
+                        return int(fields[12])
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+class TokenBucketPacer:
+    def __init__(self, rate: float, burst: float) -> None:
+        """
+        Token-bucket pacer that spreads bursts of datagrams over time.
+
+        Args:
+            rate (float): Sustained rate in bytes per second.
+            burst (float): Bucket depth in bytes; up to this much is sent back-to-back.
+        """
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+
+    def consume(self, nbytes: int) -> None:
+        """Block until nbytes worth of tokens are available, then take them."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= nbytes
+        if self._tokens < 0:
+            # Sleep off the deficit; the negative balance is repaid by refill.
+            time.sleep(-self._tokens / self.rate)
+
+
+class DatagramSender:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        sndbuf: Optional[int] = None,
+        pacer: Optional[TokenBucketPacer] = None,
+        source: Optional[str] = None,
+    ) -> None:
+        """
+        Send timestamped chunks over UDP without building intermediate packets.
+
+        The header and payload are handed to the kernel as separate buffers
+        (scatter-gather sendmsg), so the payload is never copied in Python.
+
+        Args:
+            host (str): Destination IP address.
+            port (int): Destination port.
+            sndbuf (Optional[int]): Requested SO_SNDBUF size in bytes.
+            pacer (Optional[TokenBucketPacer]): Pacer used to smooth bursts.
+            source (Optional[str]): Local address to send from, selecting the
+                interface or tunnel the datagrams leave through.
+        """
+        self.address = (host, port)
+        self.pacer = pacer
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if source:
+            self.socket.bind((source, 0))
+        self.sndbuf = set_socket_buffer(self.socket, socket.SO_SNDBUF, sndbuf)
+        self._header = bytearray(HEADER.size)
+        self._lock = threading.Lock()
+        self.session_id = 0
+        self.seq = 0
+        self.new_session()
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.send_errors = 0
+
+    def new_session(self) -> None:
+        """Start a new stream session (call whenever the encoder output restarts)."""
+        with self._lock:
+            session_id = random.getrandbits(32)
+            while session_id == self.session_id:
+                session_id = random.getrandbits(32)
+            self.session_id = session_id
+            self.seq = 0
+
+    def send(self, payload, flags: int = 0) -> None:
+        """
+        Send a single chunk with a timestamp/session/sequence header.
+
+        Args:
+            payload: A bytes-like object (bytes, bytearray or memoryview).
+            flags (int): Header flags such as FLAG_KEYFRAME.
+        """
+        with self._lock:
+            size = len(payload)
+            if self.pacer:
+                self.pacer.consume(size + HEADER.size)
+            HEADER.pack_into(self._header, 0, time.time(), self.session_id, self.seq, flags, size)
+            self.seq = (self.seq + 1) & 0xFFFFFFFF
+            self.transmit(self._header, payload, size)
+
+    def transmit(self, header, payload, size: int) -> bool:
+        """Send an already built header and its payload; returns False on failure."""
+        try:
+            self.socket.sendmsg([header, payload], [], 0, self.address)
+        except OSError as e:
+            self.send_errors += 1
+            logging.debug("UDP send failed: %s", e)
+            return False
+        self.packets_sent += 1
+        self.bytes_sent += size
+        return True
+
+    def send_batch(self, payloads) -> None:
+        """Send a sequence of chunks back-to-back (subject to pacing)."""
+        for payload in payloads:
+            self.send(payload)
+
+    def drops(self) -> Optional[int]:
+        """Kernel drop counter for the sending socket."""
+        return read_socket_drops(self.socket)
+
+    def close(self) -> None:
+        """Close the UDP socket."""
+        self.socket.close()
+
+
+class MultipathSender:
+    MODES = ("duplicate", "parity")
+
+    def __init__(
+        self,
+        paths: Sequence[Tuple[str, int, Optional[str]]],
+        mode: str = "duplicate",
+        parity_group: int = 4,
+        sndbuf: Optional[int] = None,
+        pacer: Optional[TokenBucketPacer] = None,
+    ) -> None:
+        """
+        Send one stream over several network paths (interfaces or tunnels).
+
+        In "duplicate" mode every chunk goes out on every path, so the receiver
+        can take whichever copy arrives first. In "parity" mode chunks go out
+        on the first path only, and after every `parity_group` chunks an XOR
+        parity datagram goes out on the next of the other paths, so that any
+        single lost chunk of a group can be rebuilt at a fraction of the
+        bandwidth. Pacing applies to the stream once, not per path.
+
+        Exposes the same interface as DatagramSender; packets_sent and
+        bytes_sent count the stream, the per-path figures are on self.paths.
+
+        Args:
+            paths (Sequence[Tuple[str, int, Optional[str]]]): (host, port, source address)
+                per path; the source address selects the outgoing interface.
+            mode (str): "duplicate" or "parity".
+            parity_group (int): Chunks covered by one parity datagram.
+            sndbuf (Optional[int]): Requested SO_SNDBUF size per path socket.
+            pacer (Optional[TokenBucketPacer]): Pacer used to smooth bursts.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown multipath mode {mode!r}; expected one of {self.MODES}.")
+        if len(paths) < 2:
+            raise ValueError("Multipath sending needs at least two paths.")
+        self.mode = mode
+        self.parity_group = parity_group
+        self.pacer = pacer
+        self.paths: List[DatagramSender] = [
+            DatagramSender(host, port, sndbuf=sndbuf, source=source) for host, port, source in paths
+        ]
+        self.sndbuf = self.paths[0].sndbuf
+        self._header = bytearray(HEADER.size)
+        self._parity_header = bytearray(HEADER.size)
+        self._lock = threading.Lock()
+        self.session_id = 0
+        self.seq = 0
+        self.new_session()
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.parity_sent = 0
+
+    @property
+    def send_errors(self) -> int:
+        return sum(path.send_errors for path in self.paths)
+
+    def new_session(self) -> None:
+        """Start a new stream session (call whenever the encoder output restarts)."""
+        with self._lock:
+            session_id = random.getrandbits(32)
+            while session_id == self.session_id:
+                session_id = random.getrandbits(32)
+            self.session_id = session_id
+            self.seq = 0
+            self._reset_parity()
+            self._parity_path = 1
+
+    def _reset_parity(self) -> None:
+        self._parity_xor = 0
+        self._parity_sizes = 0
+        self._parity_flags = 0
+        self._parity_count = 0
+        self._parity_max = 0
+
+    def send(self, payload, flags: int = 0) -> None:
+        """
+        Send a single chunk with a timestamp/session/sequence header on the
+        configured paths.
+        """
+        with self._lock:
+            size = len(payload)
+            if self.pacer:
+                self.pacer.consume(size + HEADER.size)
+            seq = self.seq
+            HEADER.pack_into(self._header, 0, time.time(), self.session_id, seq, flags, size)
+            self.seq = (seq + 1) & 0xFFFFFFFF
+            if self.mode == "duplicate":
+                sent = [path.transmit(self._header, payload, size) for path in self.paths]
+                delivered = any(sent)
+            else:
+                delivered = self.paths[0].transmit(self._header, payload, size)
+                self._add_to_parity(seq, payload, size, flags)
+            if delivered:
+                self.packets_sent += 1
+                self.bytes_sent += size
+
+    def _add_to_parity(self, seq: int, payload, size: int, flags: int) -> None:
+        """Fold a chunk into the current parity group and send the parity when it is full."""
+        # Little-endian integers make shorter chunks implicitly zero-padded.
+        self._parity_xor ^= int.from_bytes(payload, 'little')
+        self._parity_sizes ^= size
+        self._parity_flags ^= flags
+        self._parity_max = max(self._parity_max, size)
+        self._parity_count += 1
+        if self._parity_count < self.parity_group:
+            return
+        first_seq = (seq - self.parity_group + 1) & 0xFFFFFFFF
+        body = (PARITY_HEADER.pack(self.parity_group, self._parity_sizes, self._parity_flags)
+                + self._parity_xor.to_bytes(self._parity_max, 'little'))
+        HEADER.pack_into(self._parity_header, 0, time.time(), self.session_id, first_seq,
+                         FLAG_PARITY, len(body))
+        if self.paths[self._parity_path].transmit(self._parity_header, body, len(body)):
+            self.parity_sent += 1
+        self._parity_path = self._parity_path % (len(self.paths) - 1) + 1
+        self._reset_parity()
+
+    def send_batch(self, payloads) -> None:
+        """Send a sequence of chunks back-to-back (subject to pacing)."""
+        for payload in payloads:
+            self.send(payload)
+
+    def drops(self) -> Optional[int]:
+        """Kernel drop counters of all path sockets, summed."""
+        counts = [path.drops() for path in self.paths]
+        counts = [count for count in counts if count is not None]
+        return sum(counts) if counts else None
+
+    def close(self) -> None:
+        """Close all path sockets."""
+        for path in self.paths:
+            path.close()
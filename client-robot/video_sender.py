@@ -1,24 +1,23 @@
 import cv2
-import socket
-import struct
 import time
 import logging
 import threading
 import subprocess
-from typing import Optional
-from camera_utils import find_available_camera
-import sys
-import os
-import logging
-
-def restart_application():
-    logging.info("Restarting the entire application gracefully...")
-    # Perform any additional cleanup if necessary before restarting.
-    python = sys.executable
-    os.execl(python, python, *sys.argv)
+from typing import Optional, Sequence, Tuple
+import metrics
+from camera_utils import find_available_camera, find_available_cameras
+from stereo_capture import StereoCapture
+from udp_transport import (DatagramSender, MultipathSender, TokenBucketPacer, contains_random_access,
+                           DEFAULT_CHUNK_SIZE, TS_PACKET_SIZE, FLAG_KEYFRAME)
 
 
 class VideoSender:
+    # Seconds without a captured frame / encoded output before a component counts as failed.
+    CAMERA_TIMEOUT = 1.0
+    ENCODER_TIMEOUT = 2.0
+    # Seconds a freshly opened camera gets to deliver its first frame (USB cameras warm up slowly).
+    CAMERA_STARTUP_GRACE = 5.0
+
     def __init__(
         self,
         host: str,
@@ -28,9 +27,36 @@ class VideoSender:
         height: int = 480,
         ffmpeg_quality: int = 5,  # Lower values indicate higher quality for MPEG-4 encoder
         framerate: int = 30,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        sndbuf: Optional[int] = 1024 * 1024,
+        pacing_rate: Optional[int] = 3_000_000,
+        paths: Optional[Sequence[Tuple[str, int, Optional[str]]]] = None,
+        multipath_mode: str = "duplicate",
+        parity_group: int = 4,
+        views: int = 1,
+        camera_indices: Optional[Sequence[int]] = None,
+        pair_tolerance: float = 0.010,
     ) -> None:
         """
         Initialize the VideoSender with a persistent FFmpeg process for MPEG-4 encoding.
+
+        Args:
+            chunk_size (int): Maximum MPEG-TS payload per datagram (multiple of 188).
+            sndbuf (Optional[int]): Requested SO_SNDBUF size in bytes.
+            pacing_rate (Optional[int]): Pacing rate in bytes per second; None disables pacing.
+                The default spreads a ~100 KB keyframe over one 30 fps frame interval.
+            paths (Optional[Sequence[Tuple[str, int, Optional[str]]]]): Two or more
+                (host, port, source address) paths to send over instead of host:port.
+            multipath_mode (str): "duplicate" (every chunk on every path) or "parity"
+                (chunks on the first path, XOR parity on the others).
+            parity_group (int): Chunks per parity datagram in "parity" mode.
+            views (int): Number of cameras (2 for stereo). Their time-aligned frames
+                are packed side by side, left to right, into one encoded frame of
+                views * width pixels, so the views share frame numbers and timing.
+            camera_indices (Optional[Sequence[int]]): Camera indices, left to right,
+                when views > 1; auto-detected when None.
+            pair_tolerance (float): Maximum capture time difference between the views
+                of one frame, in seconds.
         """
         self.host = host
         self.port = port
@@ -38,13 +64,33 @@ class VideoSender:
         self.height = height
         self.ffmpeg_quality = ffmpeg_quality
         self.framerate = framerate
+        self.chunk_size = chunk_size - chunk_size % TS_PACKET_SIZE
+        self.sndbuf = sndbuf
+        self.pacing_rate = pacing_rate
+        self.paths = paths
+        self.multipath_mode = multipath_mode
+        self.parity_group = parity_group
+        self.views = views
+        self.pair_tolerance = pair_tolerance
+        self.encode_width = width * views
         self._stop_event = threading.Event()
         self.latest_frame = None
         self.frame_lock = threading.Lock()
         self.capture_failure_count = 0  # Track consecutive capture failures
+        self.auto_detect_camera = camera_index is None and camera_indices is None
+        self.last_frame_time: Optional[float] = None  # None until the camera delivers a frame.
+        self.camera_opened_time = time.monotonic()
+        self.last_output_time = time.monotonic()
+        self.encoder_fed = False  # Whether the current FFmpeg process has been given a frame.
+        self.encoder_output = False  # Whether the current FFmpeg process has produced output.
 
         # Auto-detect camera if index is not provided
-        if camera_index is None:
+        if views > 1:
+            self.camera_indices = list(camera_indices or find_available_cameras(views))
+            if len(self.camera_indices) < views:
+                raise RuntimeError(f"Found {len(self.camera_indices)} of {views} cameras.")
+            self.camera_index = self.camera_indices[0]
+        elif camera_index is None:
             self.camera_index = find_available_camera()
             if self.camera_index is None:
                 raise RuntimeError("No available camera found.")
@@ -54,22 +100,88 @@ class VideoSender:
         self._init_camera()
         self._init_socket()
         self._init_ffmpeg()
+        self.output_thread = None
+
+        self._init_metrics()
 
         # Start a dedicated thread to continuously capture raw frames
-        self.capture_thread = threading.Thread(target=self._capture_frames, daemon=True)
-        self.capture_thread.start()
+        self._start_capture_thread()
 
-        logging.info(f"VideoSender initialized on camera index {self.camera_index}.")
+        if self.views > 1:
+            logging.info(f"VideoSender initialized on cameras {self.camera_indices}, side by side.")
+        else:
+            logging.info(f"VideoSender initialized on camera index {self.camera_index}.")
 
     def _init_camera(self):
         """Initialize the camera capture."""
+        self.camera_opened_time = time.monotonic()
+        if self.views > 1:
+            # Views further apart than one frame interval are not sent together.
+            self.capture = StereoCapture(self.camera_indices, self.width, self.height,
+                                         tolerance=self.pair_tolerance, max_skew=1.0 / self.framerate)
+            return
         self.capture = cv2.VideoCapture(self.camera_index)
         self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
         self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
 
     def _init_socket(self):
-        """Initialize the UDP socket."""
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        """Initialize the UDP sender, pacing bursts in steps of a few datagrams."""
+        pacer = None
+        if self.pacing_rate:
+            pacer = TokenBucketPacer(self.pacing_rate, burst=4 * self.chunk_size)
+        if self.paths:
+            self.sender = MultipathSender(self.paths, mode=self.multipath_mode,
+                                          parity_group=self.parity_group,
+                                          sndbuf=self.sndbuf, pacer=pacer)
+            logging.info("Sending video over %d paths (%s): %s", len(self.paths), self.multipath_mode,
+                         ", ".join(f"{source or '*'} -> {host}:{port}" for host, port, source in self.paths))
+        else:
+            self.sender = DatagramSender(self.host, self.port, sndbuf=self.sndbuf, pacer=pacer)
+
+    def _init_metrics(self) -> None:
+        """Register this sender's metrics; counters kept by the UDP sender are read at scrape time."""
+        self._frames_captured = metrics.counter(
+            "video_sender_frames_captured_total", "Frames read from the camera.")
+        self._capture_failures = metrics.counter(
+            "video_sender_capture_failures_total", "Failed camera reads.")
+        self._capture_interval = metrics.histogram(
+            "video_sender_capture_interval_seconds", "Time between successfully captured frames.")
+        self._frames_written = metrics.counter(
+            "video_sender_frames_written_total", "Raw frames written to the FFmpeg encoder.")
+        self._encoder_write = metrics.histogram(
+            "video_sender_encoder_write_seconds", "Time to write one raw frame to FFmpeg's stdin.")
+        metrics.counter("video_sender_packets_sent_total", "Video datagrams sent.",
+                        fn=lambda: self.sender.packets_sent)
+        metrics.counter("video_sender_bytes_sent_total", "Video payload bytes sent.",
+                        fn=lambda: self.sender.bytes_sent)
+        metrics.counter("video_sender_send_errors_total", "Failed datagram sends.",
+                        fn=lambda: self.sender.send_errors)
+        metrics.gauge("video_sender_socket_drops", "Kernel drop counter of the video socket.",
+                      fn=lambda: self.sender.drops())
+        metrics.gauge("video_sender_encoder_output_age_seconds", "Time since FFmpeg last produced output.",
+                      fn=lambda: time.monotonic() - self.last_output_time)
+        if self.paths:
+            for index, path in enumerate(self.sender.paths):
+                labels = {"path": str(index)}
+                metrics.counter("video_sender_path_packets_total", "Datagrams sent per path.",
+                                labels, fn=lambda path=path: path.packets_sent)
+                metrics.counter("video_sender_path_send_errors_total", "Failed sends per path.",
+                                labels, fn=lambda path=path: path.send_errors)
+            metrics.counter("video_sender_parity_packets_total", "Parity datagrams sent.",
+                            fn=lambda: self.sender.parity_sent)
+
+    def _start_capture_thread(self) -> None:
+        """Start a capture thread with its own stop event, so it can be replaced alone."""
+        self._capture_stop = threading.Event()
+        self.capture_thread = threading.Thread(
+            target=self._capture_frames, args=(self.capture, self._capture_stop), daemon=True)
+        self.capture_thread.start()
+
+    def _start_output_thread(self) -> None:
+        """Start the thread that sends the current FFmpeg process's output."""
+        self.output_thread = threading.Thread(
+            target=self._send_encoded_output, args=(self.ffmpeg_process,), daemon=True)
+        self.output_thread.start()
 
     def _init_ffmpeg(self):
         """Initialize the persistent FFmpeg process."""
@@ -78,7 +190,7 @@ class VideoSender:
             "-y",  # overwrite output
             "-f", "rawvideo",
             "-pix_fmt", "bgr24",
-            "-s", f"{self.width}x{self.height}",
+            "-s", f"{self.encode_width}x{self.height}",
             "-r", str(self.framerate),
             "-i", "-",  # read raw video from stdin
             "-c:v", "mpeg4",
@@ -92,41 +204,159 @@ class VideoSender:
             stdout=subprocess.PIPE,
             bufsize=0
         )
+        self.last_output_time = time.monotonic()
+        self.encoder_fed = False
+        self.encoder_output = False
 
-    def _capture_frames(self) -> None:
-        while not self._stop_event.is_set():
-            ret, frame = self.capture.read()
+    def _capture_frames(self, capture, stop_event) -> None:
+        """
+        Capture frames until stopped. Failures are only counted here; the
+        supervisor notices the missing frames and restarts the camera.
+        """
+        while not stop_event.is_set() and not self._stop_event.is_set():
+            ret, frame = capture.read()
             if ret:
                 with self.frame_lock:
                     self.latest_frame = frame
+                now = time.monotonic()
+                if self.last_frame_time is not None:
+                    self._capture_interval.observe(now - self.last_frame_time)
+                self._frames_captured.inc()
+                self.last_frame_time = now
                 self.capture_failure_count = 0  # Reset failure count on success
             else:
+                self._capture_failures.inc()
                 self.capture_failure_count += 1
-                logging.warning("Failed to capture frame in capture thread. Failure count: %d", 
-                                self.capture_failure_count)
-                if self.capture_failure_count >= 10:
-                    logging.error("Capture failure count reached 10. Restarting application.")
-                    self.cleanup()  # Clean up resources before restarting
-                    restart_application()  # Gracefully restart the entire app
-                    return  # This line won't be reached as os.execl replaces the process.
+                if self.capture_failure_count in (1, 10) or self.capture_failure_count % 100 == 0:
+                    logging.warning("Failed to capture frame in capture thread. Failure count: %d",
+                                    self.capture_failure_count)
+                time.sleep(0.05)
             time.sleep(0.005)
 
+    def camera_healthy(self) -> Optional[bool]:
+        """
+        The camera is healthy while frames keep arriving. Until a freshly
+        opened camera delivers its first frame it is starting (None), for at
+        most CAMERA_STARTUP_GRACE seconds. With several views, each camera
+        must keep delivering on its own.
+        """
+        if not self.capture_thread.is_alive():
+            return False
+        if self.views > 1:
+            if time.monotonic() - self.camera_opened_time < self.CAMERA_STARTUP_GRACE:
+                if any(reader.last_frame_time is None for reader in self.capture.readers):
+                    return None
+            if self.capture.stale_views(self.CAMERA_TIMEOUT):
+                return False
+        if self.last_frame_time is None:
+            if time.monotonic() - self.camera_opened_time < self.CAMERA_STARTUP_GRACE:
+                return None
+            return False
+        return time.monotonic() - self.last_frame_time < self.CAMERA_TIMEOUT
+
+    def encoder_healthy(self) -> Optional[bool]:
+        """
+        The encoder is healthy while FFmpeg runs and keeps producing output.
+        Until a fresh FFmpeg process produces its first output it is starting
+        (None), for at most ENCODER_TIMEOUT seconds after its first frame.
+        """
+        if self.ffmpeg_process.poll() is not None:
+            return False
+        if self.output_thread is None or not self.encoder_fed:
+            # Nothing to encode yet (pipeline not started, or no frame from the
+            # camera); missing output is then the camera's fault, not FFmpeg's.
+            return None
+        if (not self.output_thread.is_alive()
+                or time.monotonic() - self.last_output_time >= self.ENCODER_TIMEOUT):
+            return False
+        return True if self.encoder_output else None
+
+    def restart_camera(self) -> None:
+        """Reopen the camera in place without touching the encoder or the network."""
+        logging.info("Restarting camera...")
+        self._capture_stop.set()
+        if self.capture_thread.is_alive():
+            self.capture_thread.join(timeout=1)
+        if self.capture.isOpened():
+            self.capture.release()
+        if self.auto_detect_camera:
+            # The device may re-enumerate under a different index after a USB reset.
+            if self.views > 1:
+                camera_indices = find_available_cameras(self.views)
+                if len(camera_indices) < self.views:
+                    raise RuntimeError(f"Found {len(camera_indices)} of {self.views} cameras.")
+                self.camera_indices = camera_indices
+                self.camera_index = camera_indices[0]
+            else:
+                camera_index = find_available_camera()
+                if camera_index is None:
+                    raise RuntimeError("No available camera found.")
+                self.camera_index = camera_index
+        self.capture_failure_count = 0
+        self.last_frame_time = None
+        self._init_camera()
+        if not self.capture.isOpened():
+            if self.views > 1:
+                self.capture.release()
+                raise RuntimeError(f"Failed to open cameras {self.camera_indices}.")
+            raise RuntimeError(f"Failed to open camera index {self.camera_index}.")
+        self._start_capture_thread()
+
+    def restart_encoder(self) -> None:
+        """
+        Replace the FFmpeg process in place. The new output is sent as a new stream
+        session so the doctor's receiver resyncs onto its standby decoder.
+        """
+        logging.info("Restarting FFmpeg encoder...")
+        self._terminate_ffmpeg()
+        if self.output_thread is not None and self.output_thread.is_alive():
+            self.output_thread.join(timeout=1)
+        self._init_ffmpeg()
+        self.sender.new_session()
+        self._start_output_thread()
+
 
-    def _send_encoded_output(self) -> None:
+    def _send_encoded_output(self, process) -> None:
         """
-        Read encoded MPEG-4 output from FFmpeg's stdout in chunks and send them over UDP.
-        Each chunk is prefixed with a timestamp and its size.
+        Read encoded MPEG-4 output from FFmpeg's stdout and send it over UDP.
+        Output is read into a reusable buffer and sent as soon as whole 188-byte
+        MPEG-TS packets are available, up to chunk_size bytes per datagram; a
+        trailing partial TS packet is kept for the next read.
+        Each chunk is prefixed with a timestamp, session ID, sequence number,
+        keyframe flag and its size.
         """
+        buffer = bytearray(self.chunk_size * 4)
+        view = memoryview(buffer)
+        filled = 0
+        last_drop_check = time.monotonic()
+        reported_drops = 0
         while not self._stop_event.is_set():
             try:
-                chunk = self.ffmpeg_process.stdout.read(4096)
-                if not chunk:
+                nbytes = process.stdout.readinto(view[filled:])
+                if not nbytes:
                     break  # FFmpeg process ended
-                timestamp = time.time()
-                timestamp_data = struct.pack('d', timestamp)
-                packet = timestamp_data + struct.pack('i', len(chunk)) + chunk
-                self.socket.sendto(packet, (self.host, self.port))
+                self.last_output_time = time.monotonic()
+                self.encoder_output = True
+                filled += nbytes
+                aligned = filled - filled % TS_PACKET_SIZE
+                for offset in range(0, aligned, self.chunk_size):
+                    chunk = view[offset:min(offset + self.chunk_size, aligned)]
+                    flags = FLAG_KEYFRAME if contains_random_access(chunk) else 0
+                    self.sender.send(chunk, flags)
+                remainder = filled - aligned
+                if remainder:
+                    buffer[:remainder] = buffer[aligned:filled]
+                filled = remainder
                 logging.debug("Encoded chunk sent.")
+
+                now = time.monotonic()
+                if now - last_drop_check >= 1.0:
+                    last_drop_check = now
+                    drops = self.sender.drops()
+                    if drops is not None and drops > reported_drops:
+                        logging.warning("Kernel dropped %d outgoing video datagrams.",
+                                        drops - reported_drops)
+                        reported_drops = drops
             except Exception as e:
                 logging.error("Error reading from FFmpeg stdout: %s", e)
                 break
@@ -135,49 +365,41 @@ class VideoSender:
         """
         Continuously write raw frames to FFmpeg's stdin for encoding,
         and simultaneously send the encoded output over UDP.
+        A failing encoder is replaced by the supervisor; frames are simply
+        skipped until the new FFmpeg process accepts them.
         """
         logging.info("Starting video transmission using persistent FFmpeg process...")
         # Start thread for reading and sending FFmpeg's encoded output
-        ffmpeg_sender_thread = threading.Thread(target=self._send_encoded_output, daemon=True)
-        ffmpeg_sender_thread.start()
+        self._start_output_thread()
+        write_failures = 0
         try:
             while not self._stop_event.is_set():
                 with self.frame_lock:
                     frame = self.latest_frame
                 if frame is None:
+                    time.sleep(0.01)  # No frame from the camera yet.
                     continue
                 try:
+                    started = time.perf_counter()
                     self.ffmpeg_process.stdin.write(frame.tobytes())
+                    self._encoder_write.observe(time.perf_counter() - started)
+                    self._frames_written.inc()
+                    if not self.encoder_fed:
+                        # The output timeout starts with the first frame FFmpeg gets.
+                        self.encoder_fed = True
+                        self.last_output_time = time.monotonic()
+                    write_failures = 0
                 except Exception as e:
-                    logging.error("Error writing to FFmpeg stdin: %s", e)
-                    break
+                    write_failures += 1
+                    if write_failures == 1:
+                        logging.error("Error writing to FFmpeg stdin: %s", e)
+                    time.sleep(0.05)
                 time.sleep(0.005)
         except Exception as e:
             logging.error("Error in send_frames: %s", e)
         finally:
             self.cleanup()
-            ffmpeg_sender_thread.join(timeout=1)
-
-    def _restart_process(self) -> None:
-        """
-        Restart the entire VideoSender process.
-        This method cleans up current resources and reinitializes them.
-        It runs in a separate thread so that the calling capture thread can exit.
-        """
-        logging.info("Restarting VideoSender process...")
-        self.cleanup()
-        time.sleep(1)  # Brief pause before reinitialization
-
-        # Clear the stop event and reset failure counter
-        self._stop_event.clear()
-        self.capture_failure_count = 0
-
-        # Reinitialize camera and FFmpeg, and start a new capture thread.
-        self._init_camera()
-        self._init_ffmpeg()
-        self.capture_thread = threading.Thread(target=self._capture_frames, daemon=True)
-        self.capture_thread.start()
-        logging.info("VideoSender process restarted successfully.")
+            self.output_thread.join(timeout=1)
 
     def stop(self) -> None:
         """Signal the sender to stop capturing and sending frames."""
@@ -191,11 +413,19 @@ class VideoSender:
             self.capture_thread.join(timeout=1)
         if self.capture.isOpened():
             self.capture.release()
+        self._terminate_ffmpeg()
+        self.sender.close()
+        logging.info("VideoSender resources have been released.")
+
+    def _terminate_ffmpeg(self) -> None:
+        """Stop the current FFmpeg process if it is still running."""
         if self.ffmpeg_process.poll() is None:
             try:
-                self.ffmpeg_process.stdin.close()
                 self.ffmpeg_process.terminate()
+                self.ffmpeg_process.wait(timeout=1)
             except Exception as e:
                 logging.error("Error terminating FFmpeg process: %s", e)
-        self.socket.close()
-        logging.info("VideoSender resources have been released.")
+        try:
+            self.ffmpeg_process.stdin.close()
+        except Exception:
+            pass  # Closing flushes into a pipe whose reader is already gone.
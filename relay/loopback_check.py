@@ -0,0 +1,205 @@
+import argparse
+import json
+import logging
+import random
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from relay import FLAG_KEYFRAME, HEADER, VideoRelay
+
+
+class LoopbackSubscriber:
+    def __init__(
+        self,
+        relay: Tuple[str, int],
+        name: str,
+        max_rate: Optional[float] = None,
+        recovery: bool = True,
+        nack_gaps: bool = False,
+        loss: float = 0.0,
+    ) -> None:
+        """
+        A subscriber on loopback that checks what the relay delivers.
+
+        New datagrams are dropped locally with probability `loss` to exercise
+        NACK recovery (retransmissions are never dropped); gaps are NACKed
+        when `nack_gaps` is set.
+
+        Args:
+            relay (Tuple[str, int]): The relay's subscribe address.
+            name (str): Subscriber name.
+            max_rate (Optional[float]): Requested rate limit in bytes per second.
+            recovery (bool): Whether the relay should retransmit NACKed datagrams.
+            nack_gaps (bool): Whether to NACK gaps.
+            loss (float): Probability of discarding a received datagram (0..1).
+        """
+        self.relay = relay
+        self.name = name
+        self.nack_gaps = nack_gaps
+        self.loss = loss
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(('127.0.0.1', 0))
+        self.socket.settimeout(0.2)
+        self.subscribe = json.dumps({"type": "subscribe", "name": name, "max_rate": max_rate,
+                                     "recovery": recovery}).encode()
+        self.received: Set[int] = set()
+        self.corrupt = 0
+        self.first_seq: Optional[int] = None
+        self._highest: Optional[int] = None
+        self._running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self.socket.sendto(self.subscribe, self.relay)
+        self.thread.start()
+
+    def _run(self) -> None:
+        while self._running:
+            try:
+                packet = self.socket.recv(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            _, _, seq, flags, size = HEADER.unpack_from(packet)
+            if (self._highest is None or seq > self._highest) and random.random() < self.loss:
+                continue
+            if packet[HEADER.size:] != payload(seq, size):
+                self.corrupt += 1
+            if self.first_seq is None:
+                self.first_seq = seq
+                if not flags & FLAG_KEYFRAME:
+                    self.corrupt += 1  # Forwarding must start at a keyframe.
+            self.received.add(seq)
+            if self._highest is not None and seq > self._highest + 1 and self.nack_gaps:
+                missing = [s for s in range(self._highest + 1, seq) if s not in self.received]
+                self.socket.sendto(json.dumps({"type": "nack", "seqs": missing}).encode(), self.relay)
+            if self._highest is None or seq > self._highest:
+                self._highest = seq
+
+    def nack(self, seqs: List[int]) -> None:
+        self.socket.sendto(json.dumps({"type": "nack", "seqs": seqs}).encode(), self.relay)
+
+    def stop(self) -> None:
+        self._running = False
+        self.socket.sendto(json.dumps({"type": "unsubscribe"}).encode(), self.relay)
+        self.thread.join(timeout=1)
+        self.socket.close()
+
+
+def payload(seq: int, size: int) -> bytes:
+    """Deterministic chunk contents, so subscribers can verify what they receive."""
+    return bytes((seq + i) & 0xFF for i in range(size))
+
+
+def send_stream(ingest: Tuple[str, int], count: int, rate: float, size: int, gop: int,
+                session_id: int = 0x5EED) -> None:
+    """Send `count` synthetic video datagrams with a keyframe every `gop` datagrams."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    interval = 1.0 / rate
+    next_send = time.monotonic()
+    for seq in range(count):
+        flags = FLAG_KEYFRAME if seq % gop == 0 else 0
+        sock.sendto(HEADER.pack(time.time(), session_id, seq, flags, size) + payload(seq, size), ingest)
+        next_send += interval
+        delay = next_send - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    sock.close()
+
+
+def rejected(relay: VideoRelay, address: Tuple[str, int], max_rate) -> bool:
+    """Whether a subscribe with this max_rate is refused without creating a subscriber."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.sendto(json.dumps({"type": "subscribe", "name": "bad", "max_rate": max_rate}).encode(), address)
+    time.sleep(0.2)
+    with relay._subscribers_lock:
+        refused = sock.getsockname() not in relay.subscribers
+    sock.close()
+    return refused
+
+
+def main() -> int:
+    """
+    Run the relay on loopback with several local subscribers and check them:
+
+        python loopback_check.py --count 3000 --rate 1000
+
+    "lossy" drops 5% of what it receives and NACKs the gaps, which must all be
+    retransmitted; "plain" must get everything; "slow" is rate limited below
+    the stream rate, so it must fall behind, resync at keyframes only, and
+    have NACKs from before its resync discarded as stale. After a new session
+    starts at seq 0, NACKs for it must be retransmitted again. Invalid max_rate
+    values must be refused. Exits with 1 if any check fails.
+    """
+    parser = argparse.ArgumentParser(description="Check the video relay on loopback.")
+    parser.add_argument("--count", type=int, default=3000, help="datagrams to send")
+    parser.add_argument("--rate", type=float, default=1000, help="datagrams per second")
+    parser.add_argument("--size", type=int, default=1316, help="payload bytes per datagram")
+    parser.add_argument("--gop", type=int, default=30, help="datagrams per keyframe interval")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    relay = VideoRelay(('127.0.0.1', 0), ('127.0.0.1', 0), history=4096)
+    relay.start()
+    ingest = relay.ingest.getsockname()
+    address = relay.egress.getsockname()
+
+    stream_rate = args.rate * (HEADER.size + args.size)
+    subscribers: Dict[str, LoopbackSubscriber] = {
+        "plain": LoopbackSubscriber(address, "plain", recovery=False),
+        "lossy": LoopbackSubscriber(address, "lossy", nack_gaps=True, loss=0.05),
+        "slow": LoopbackSubscriber(address, "slow", max_rate=stream_rate / 4),
+    }
+    for subscriber in subscribers.values():
+        subscriber.start()
+    time.sleep(0.2)
+
+    send_stream(ingest, args.count, args.rate, args.size, args.gop)
+    time.sleep(0.5)
+    subscribers["slow"].nack([0, 1, 2])  # From before the slow subscriber's resyncs.
+    time.sleep(0.2)
+    # An encoder restart starts a new session at seq 0; its NACKs are not stale.
+    before = {entry["name"]: entry for entry in relay.stats()["subscribers"]}["lossy"]
+    send_stream(ingest, args.gop * 2, args.rate, args.size, args.gop, session_id=0x5EEE)
+    time.sleep(0.2)
+    subscribers["lossy"].nack([1, 2, 3])
+    time.sleep(0.2)
+    stats = {entry["name"]: entry for entry in relay.stats()["subscribers"]}
+
+    checks = [
+        ("plain received everything", len(subscribers["plain"].received) == args.count),
+        ("lossy recovered every gap", len(subscribers["lossy"].received) >= args.count - 1
+         and stats["lossy"]["retransmits"] > 0),
+        ("slow fell behind and resynced", stats["slow"]["keyframe_resyncs"] > 0),
+        ("slow stale NACKs discarded", stats["slow"]["retransmits_stale"] >= 3
+         and stats["slow"]["retransmits"] == 0),
+        ("new session NACKs retransmitted",
+         stats["lossy"]["retransmits"] - before["retransmits"] >= 3
+         and stats["lossy"]["retransmits_stale"] == before["retransmits_stale"]),
+        ("no corrupt data, each starts at a keyframe",
+         all(subscriber.corrupt == 0 for subscriber in subscribers.values())),
+        ("max_rate 'fast' refused", rejected(relay, address, "fast")),
+        ("max_rate -1 refused", rejected(relay, address, -1)),
+        ("max_rate [1] refused", rejected(relay, address, [1])),
+    ]
+    for name, subscriber in subscribers.items():
+        print(f"{name:6} received {len(subscriber.received):5}/{args.count}  "
+              f"retransmits {stats[name]['retransmits']:4}  stale {stats[name]['retransmits_stale']:3}  "
+              f"resyncs {stats[name]['keyframe_resyncs']:3}  dropped {stats[name]['packets_dropped']}")
+    for subscriber in subscribers.values():
+        subscriber.stop()
+    relay.stop()
+
+    failed = 0
+    for description, ok in checks:
+        print(f"{'ok  ' if ok else 'FAIL'} {description}")
+        failed += not ok
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import logging
+import time
+from relay import VideoRelay
+
+
+def setup_logging() -> None:
+    """Configure logging format and level."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+
+def main() -> None:
+    """Run the video relay on the WireGuard hub."""
+    setup_logging()
+
+    # Configuration
+    INGEST = ('10.8.0.1', 1189)      # The robot's VideoSender streams here.
+    SUBSCRIBE = ('10.8.0.1', 1190)   # Doctors, observers and recorders subscribe here.
+    RECORD_DIR = None                # e.g. '/var/lib/surgery-relay' to record on the hub.
+
+    relay = VideoRelay(INGEST, SUBSCRIBE, record_dir=RECORD_DIR)
+    relay.start()
+
+    try:
+        while True:
+            time.sleep(10)
+            stats = relay.stats()
+            logging.info("Ingest: %d packets, %d subscriber(s).",
+                         stats["packets_received"], len(stats["subscribers"]))
+    except KeyboardInterrupt:
+        logging.info("KeyboardInterrupt received, stopping relay...")
+        relay.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+import collections
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Same datagram header as the robot's VideoSender: timestamp, stream session ID,
+# sequence number, flags and chunk size. Datagrams are forwarded verbatim.
+HEADER = struct.Struct('<dIIHH')
+FLAG_KEYFRAME = 0x1
+SEQ_MASK = 0xFFFFFFFF
+
+
+class Subscriber:
+    def __init__(
+        self,
+        relay: "VideoRelay",
+        address: Tuple[str, int],
+        name: str,
+        max_rate: Optional[float] = None,
+        recovery: bool = True,
+        max_queue: int = 512,
+    ) -> None:
+        """
+        A viewer or recorder receiving the relayed stream.
+
+        Each subscriber has its own send queue and thread, so a slow or lossy
+        subscriber never delays the others. When its queue overflows, the queue
+        is flushed and forwarding resumes at the next keyframe.
+
+        Args:
+            relay (VideoRelay): The owning relay.
+            address (Tuple[str, int]): Where to send the stream.
+            name (str): Name used in logs and stats.
+            max_rate (Optional[float]): Send rate limit in bytes per second.
+            recovery (bool): Whether NACKed datagrams are retransmitted.
+            max_queue (int): Queue depth after which it drops to the next keyframe.
+        """
+        self.relay = relay
+        self.address = address
+        self.name = name
+        self.max_rate = max_rate
+        self.recovery = recovery
+        self.max_queue = max_queue
+        self.last_seen = time.monotonic()
+        self.connected_at = time.time()
+
+        self._queue: collections.deque = collections.deque()
+        self._retransmit: collections.deque = collections.deque()
+        self._condition = threading.Condition()
+        self._waiting_for_keyframe = True
+        # Sequence number of the keyframe forwarding last (re)started at; older
+        # datagrams are from before a flush and are not retransmitted.
+        self._resync_seq: Optional[int] = None
+        self._closed = False
+
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.packets_dropped = 0
+        self.keyframe_resyncs = 0
+        self.nacks_received = 0
+        self.retransmits = 0
+        self.retransmit_misses = 0
+        self.retransmits_stale = 0
+        self.send_errors = 0
+
+        self.thread = threading.Thread(target=self._send_loop, daemon=True)
+        self.thread.start()
+
+    def enqueue(self, packet: bytes, seq: int, keyframe: bool) -> None:
+        """Queue a live datagram, applying the drop-to-keyframe policy."""
+        with self._condition:
+            if self._waiting_for_keyframe:
+                if not keyframe:
+                    self.packets_dropped += 1
+                    return
+                self._waiting_for_keyframe = False
+                self._resync_seq = seq
+            if len(self._queue) >= self.max_queue:
+                self.packets_dropped += len(self._queue) + 1
+                self._queue.clear()
+                self._retransmit.clear()
+                self._waiting_for_keyframe = True
+                self.keyframe_resyncs += 1
+                logging.warning("Subscriber %s fell behind; skipping to next keyframe.", self.name)
+                if not keyframe:
+                    return
+                self._waiting_for_keyframe = False
+                self._resync_seq = seq
+            self._queue.append(packet)
+            self._condition.notify()
+
+    def reset_session(self, seq: int) -> None:
+        """
+        Start over for a new ingest session whose first datagram is `seq`.
+        Its sequence numbers restart, so pending retransmissions are dropped
+        and NACKs are judged against the new session only.
+        """
+        with self._condition:
+            self._retransmit.clear()
+            self._resync_seq = None if self._waiting_for_keyframe else seq
+
+    def nack(self, seqs) -> None:
+        """
+        Queue retransmissions of the given sequence numbers ahead of live data.
+        Sequence numbers from before the keyframe forwarding resumed at (or all
+        of them, while waiting for that keyframe) are discarded as stale.
+        """
+        self.nacks_received += 1
+        if not self.recovery:
+            return
+        with self._condition:
+            for seq in seqs:
+                if (self._waiting_for_keyframe or self._resync_seq is None
+                        or (seq - self._resync_seq) & SEQ_MASK >= 0x80000000):
+                    self.retransmits_stale += 1
+                    continue
+                packet = self.relay.lookup(seq)
+                if packet is None:
+                    self.retransmit_misses += 1
+                    continue
+                self._retransmit.append(packet)
+            self._condition.notify()
+
+    def _send_loop(self) -> None:
+        """Send queued datagrams, retransmissions first, at most max_rate bytes/s."""
+        next_send = time.monotonic()
+        while True:
+            with self._condition:
+                while not self._closed and not self._queue and not self._retransmit:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                retransmit = bool(self._retransmit)
+                packet = self._retransmit.popleft() if retransmit else self._queue.popleft()
+            if self.max_rate:
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_send = max(next_send, time.monotonic() - 0.01) + len(packet) / self.max_rate
+            try:
+                self.relay.egress.sendto(packet, self.address)
+            except OSError as e:
+                self.send_errors += 1
+                logging.debug("Send to %s failed: %s", self.name, e)
+                continue
+            self.packets_sent += 1
+            self.bytes_sent += len(packet)
+            if retransmit:
+                self.retransmits += 1
+
+    def close(self) -> None:
+        """Stop the send thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def stats(self) -> dict:
+        """Per-subscriber statistics."""
+        return {
+            "name": self.name,
+            "address": f"{self.address[0]}:{self.address[1]}",
+            "connected_at": self.connected_at,
+            "queue_depth": len(self._queue),
+            "waiting_for_keyframe": self._waiting_for_keyframe,
+            "packets_sent": self.packets_sent,
+            "bytes_sent": self.bytes_sent,
+            "packets_dropped": self.packets_dropped,
+            "keyframe_resyncs": self.keyframe_resyncs,
+            "nacks_received": self.nacks_received,
+            "retransmits": self.retransmits,
+            "retransmit_misses": self.retransmit_misses,
+            "retransmits_stale": self.retransmits_stale,
+            "send_errors": self.send_errors,
+        }
+
+
+class VideoRelay:
+    def __init__(
+        self,
+        ingest_address: Tuple[str, int] = ('0.0.0.0', 1189),
+        subscribe_address: Tuple[str, int] = ('0.0.0.0', 1190),
+        history: int = 2048,
+        subscriber_timeout: float = 10.0,
+        record_dir: Optional[str] = None,
+        rcvbuf: int = 4 * 1024 * 1024,
+    ) -> None:
+        """
+        Fan a single video ingest stream out to any number of subscribers.
+
+        The robot sends its stream once to the ingest port. Subscribers send JSON
+        control datagrams to the subscribe port and receive the stream from that
+        same port, so replies traverse NAT and firewalls like any UDP flow:
+
+            {"type": "subscribe", "name": "observer", "max_rate": 500000, "recovery": true}
+            {"type": "nack", "seqs": [1201, 1202]}
+            {"type": "unsubscribe"}
+            {"type": "stats"}           -> replied to with a JSON stats document
+
+        Subscriptions expire unless "subscribe" is repeated within
+        subscriber_timeout seconds. The last `history` datagrams are kept for
+        retransmission. With record_dir set, the ingest stream is also written
+        to a .ts file per stream session.
+
+        Args:
+            ingest_address (Tuple[str, int]): Address receiving the robot's stream.
+            subscribe_address (Tuple[str, int]): Address for control and egress traffic.
+            history (int): Datagrams kept for retransmission.
+            subscriber_timeout (float): Seconds without a subscribe refresh before removal.
+            record_dir (Optional[str]): Directory for server-side recordings.
+            rcvbuf (int): Requested SO_RCVBUF for the ingest socket.
+        """
+        self.history = history
+        self.subscriber_timeout = subscriber_timeout
+        self.record_dir = record_dir
+        self._stop_event = threading.Event()
+
+        self.ingest = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.ingest.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        self.ingest.bind(ingest_address)
+        self.egress = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.egress.bind(subscribe_address)
+
+        self.subscribers: Dict[Tuple[str, int], Subscriber] = {}
+        self._subscribers_lock = threading.Lock()
+        self._history: Dict[int, bytes] = {}
+        self._history_order: collections.deque = collections.deque()
+        self._history_lock = threading.Lock()
+        self._record_queue: "queue.Queue[Optional[Tuple[int, bytes]]]" = queue.Queue()
+
+        self.session_id: Optional[int] = None
+        self.packets_received = 0
+        self.bytes_received = 0
+        self.malformed = 0
+        self.sessions = 0
+        logging.info("Relay ingest on %s:%d, subscriptions on %s:%d",
+                     *self.ingest.getsockname(), *self.egress.getsockname())
+
+    def start(self) -> None:
+        """Start the ingest, control and (optional) recording threads."""
+        threading.Thread(target=self._ingest_loop, daemon=True).start()
+        threading.Thread(target=self._control_loop, daemon=True).start()
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+            threading.Thread(target=self._record_loop, daemon=True).start()
+
+    def stop(self) -> None:
+        """Stop all threads and close the sockets."""
+        self._stop_event.set()
+        self._record_queue.put(None)
+        with self._subscribers_lock:
+            for subscriber in self.subscribers.values():
+                subscriber.close()
+        self.ingest.close()
+        self.egress.close()
+
+    def lookup(self, seq: int) -> Optional[bytes]:
+        """Return a recent datagram of the current session by sequence number."""
+        with self._history_lock:
+            return self._history.get(seq)
+
+    def _ingest_loop(self) -> None:
+        """Receive the robot's stream and hand each datagram to every subscriber."""
+        buffer = bytearray(65535)
+        self.ingest.settimeout(1.0)
+        while not self._stop_event.is_set():
+            try:
+                nbytes = self.ingest.recv_into(buffer)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                if not self._stop_event.is_set():
+                    logging.error("Relay ingest error: %s", e)
+                break
+            if nbytes < HEADER.size:
+                self.malformed += 1
+                continue
+            _, session_id, seq, flags, size = HEADER.unpack_from(buffer, 0)
+            if size != nbytes - HEADER.size:
+                self.malformed += 1
+                continue
+            packet = bytes(buffer[:nbytes])
+            self.packets_received += 1
+            self.bytes_received += nbytes
+
+            if session_id != self.session_id:
+                self.session_id = session_id
+                self.sessions += 1
+                logging.info("New ingest stream session %08x.", session_id)
+                with self._history_lock:
+                    self._history.clear()
+                    self._history_order.clear()
+                with self._subscribers_lock:
+                    subscribers = list(self.subscribers.values())
+                for subscriber in subscribers:
+                    subscriber.reset_session(seq)
+            with self._history_lock:
+                self._history[seq] = packet
+                self._history_order.append(seq)
+                if len(self._history_order) > self.history:
+                    self._history.pop(self._history_order.popleft(), None)
+
+            keyframe = bool(flags & FLAG_KEYFRAME)
+            with self._subscribers_lock:
+                subscribers = list(self.subscribers.values())
+            for subscriber in subscribers:
+                subscriber.enqueue(packet, seq, keyframe)
+            if self.record_dir:
+                self._record_queue.put((session_id, packet))
+
+    def _control_loop(self) -> None:
+        """Handle subscription messages and expire silent subscribers."""
+        self.egress.settimeout(1.0)
+        while not self._stop_event.is_set():
+            try:
+                data, address = self.egress.recvfrom(65535)
+            except socket.timeout:
+                data = None
+            except OSError as e:
+                if not self._stop_event.is_set():
+                    logging.error("Relay control error: %s", e)
+                break
+            if data:
+                try:
+                    self._handle_message(json.loads(data), address)
+                except (ValueError, TypeError, AttributeError) as e:
+                    logging.warning("Invalid control message from %s: %s", address, e)
+            self._expire_subscribers()
+
+    def _handle_message(self, message: dict, address: Tuple[str, int]) -> None:
+        kind = message.get("type")
+        if kind == "subscribe":
+            max_rate = message.get("max_rate")
+            if max_rate is not None:
+                max_rate = float(max_rate)
+                if not max_rate > 0:
+                    raise ValueError(f"max_rate must be positive, got {max_rate}")
+            with self._subscribers_lock:
+                subscriber = self.subscribers.get(address)
+                if subscriber is None:
+                    subscriber = Subscriber(
+                        self, address,
+                        name=str(message.get("name") or f"{address[0]}:{address[1]}"),
+                        max_rate=max_rate,
+                        recovery=bool(message.get("recovery", True)),
+                    )
+                    self.subscribers[address] = subscriber
+                    logging.info("Subscriber %s joined from %s:%d.", subscriber.name, *address)
+                subscriber.last_seen = time.monotonic()
+        elif kind == "nack":
+            subscriber = self.subscribers.get(address)
+            if subscriber is not None:
+                subscriber.nack(int(seq) & SEQ_MASK for seq in message.get("seqs", ()))
+        elif kind == "unsubscribe":
+            with self._subscribers_lock:
+                subscriber = self.subscribers.pop(address, None)
+            if subscriber is not None:
+                subscriber.close()
+                logging.info("Subscriber %s left.", subscriber.name)
+        elif kind == "stats":
+            self.egress.sendto(json.dumps(self.stats()).encode(), address)
+        else:
+            logging.warning("Unknown control message type %r from %s.", kind, address)
+
+    def _expire_subscribers(self) -> None:
+        now = time.monotonic()
+        with self._subscribers_lock:
+            expired = [address for address, subscriber in self.subscribers.items()
+                       if now - subscriber.last_seen > self.subscriber_timeout]
+            for address in expired:
+                subscriber = self.subscribers.pop(address)
+                subscriber.close()
+                logging.info("Subscriber %s timed out.", subscriber.name)
+
+    def _record_loop(self) -> None:
+        """Write the ingest stream's MPEG-TS payload to one file per session."""
+        current_session = None
+        output = None
+        try:
+            while True:
+                item = self._record_queue.get()
+                if item is None:
+                    break
+                session_id, packet = item
+                if session_id != current_session:
+                    if output:
+                        output.close()
+                    current_session = session_id
+                    filename = time.strftime("%Y-%m-%d__%H-%M-%S") + f"__{session_id:08x}.ts"
+                    output = open(os.path.join(self.record_dir, filename), "wb")
+                    logging.info("Recording session %08x to %s.", session_id, filename)
+                output.write(memoryview(packet)[HEADER.size:])
+        finally:
+            if output:
+                output.close()
+
+    def stats(self) -> dict:
+        """Ingest and per-subscriber statistics."""
+        with self._subscribers_lock:
+            subscribers = [subscriber.stats() for subscriber in self.subscribers.values()]
+        return {
+            "session_id": self.session_id,
+            "sessions": self.sessions,
+            "packets_received": self.packets_received,
+            "bytes_received": self.bytes_received,
+            "malformed": self.malformed,
+            "subscribers": subscribers,
+        }
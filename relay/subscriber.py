@@ -0,0 +1,66 @@
+import argparse
+import json
+import socket
+import sys
+import time
+from relay import HEADER
+
+
+def main() -> None:
+    """
+    Minimal relay subscriber: writes the received MPEG-TS stream to stdout and
+    prints per-second stats to stderr, e.g. for observers or loopback tests:
+
+        python subscriber.py --relay 127.0.0.1:1190 --name observer | ffplay -
+    """
+    parser = argparse.ArgumentParser(description="Subscribe to the video relay.")
+    parser.add_argument("--relay", default="10.8.0.1:1190", help="relay host:port")
+    parser.add_argument("--name", default="observer")
+    parser.add_argument("--max-rate", type=float, default=None, help="bytes per second")
+    parser.add_argument("--stats", action="store_true", help="print relay stats and exit")
+    args = parser.parse_args()
+    host, port = args.relay.rsplit(":", 1)
+    relay = (host, int(port))
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(1.0)
+    if args.stats:
+        sock.sendto(json.dumps({"type": "stats"}).encode(), relay)
+        print(json.dumps(json.loads(sock.recv(65535)), indent=2))
+        return
+
+    subscribe = json.dumps({"type": "subscribe", "name": args.name,
+                            "max_rate": args.max_rate, "recovery": False}).encode()
+    output = sys.stdout.buffer
+    received = lost = 0
+    expected = None
+    last_refresh = 0.0
+    try:
+        while True:
+            now = time.monotonic()
+            if now - last_refresh >= 2.0:
+                sock.sendto(subscribe, relay)
+                last_refresh = now
+                print(f"[{args.name}] received {received}, lost {lost}", file=sys.stderr)
+            try:
+                packet = sock.recv(65535)
+            except socket.timeout:
+                continue
+            if len(packet) < HEADER.size:
+                continue
+            _, _, seq, _, size = HEADER.unpack_from(packet)
+            if expected is not None:
+                gap = (seq - expected) & 0xFFFFFFFF
+                if gap < 0x80000000:
+                    lost += gap
+            expected = (seq + 1) & 0xFFFFFFFF
+            received += 1
+            output.write(packet[HEADER.size:HEADER.size + size])
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        sock.sendto(json.dumps({"type": "unsubscribe"}).encode(), relay)
+
+
+if __name__ == "__main__":
+    main()